@@ -1,19 +1,60 @@
-from textblob import TextBlob
-from textblob import Word as blob_word
-from textblob import Sentence as blob_sentence
+from array import array
+from bisect import bisect_right
+
+import instrumentation
+import tokenizer
+from lemmatizer import default_lemmatizer
 
 
 class LinkedText:
-    def __init__(self, text_blob: TextBlob):
-        self.sentences = [LinkedSentence(sentence, index) for index, sentence in enumerate(text_blob.sentences)]
+    def __init__(self, sentences):
+        self.sentences = [LinkedSentence(text, lemmas, index) for index, (text, lemmas) in enumerate(sentences)]
         for sentence_a, sentence_b in zip(self.sentences[:-1], self.sentences[1:]):
             sentence_a.next = sentence_b
             sentence_b.previous = sentence_a
-        index = 0
+        self.words = [word for sentence in self.sentences for word in sentence.words]
+        for index, word in enumerate(self.words):
+            word.index = index
+
+    @staticmethod
+    def from_blob(text_blob):
+        return LinkedText(blob_sentences(text_blob))
+
+    @staticmethod
+    def from_text(text):
+        return LinkedText(text_sentences(text))
+
+    @property
+    def word_count(self):
+        return len(self.words)
+
+    @property
+    def sentence_count(self):
+        return len(self.sentences)
+
+    def lemma_id(self, word_index):
+        return self.words[word_index].lemma_id
+
+    def sentence_of(self, word_index):
+        return self.words[word_index].parent.parent_index
+
+    def is_sentence_end(self, word_index):
+        return self.words[word_index].next is None
+
+    def sentence_text(self, sentence_index):
+        return self.sentences[sentence_index].text
+
+    def sentence_lemma_ids(self, sentence_index):
+        return [word.lemma_id for word in self.sentences[sentence_index].words]
+
+    def sentence_offsets(self):
+        offsets = [0]
         for sentence in self.sentences:
-            for word in sentence.words:
-                word.index = index
-                index += 1
+            offsets.append(offsets[-1] + len(sentence))
+        return offsets
+
+    def midpoint(self, word_index_a, word_index_b):
+        return (word_index_a + word_index_b) // 2
 
     def __iter__(self):
         return iter(self.sentences)
@@ -25,11 +66,29 @@ class LinkedText:
         return self.sentences[item]
 
 
+def text_sentences(text):
+    with instrumentation.current.timer("sentence_split"):
+        sentences = tokenizer.default_tokenizer.sentence_words(text)
+    with instrumentation.current.timer("lemmatize"):
+        return [(sentence, [default_lemmatizer.lemmatize(word) for word in words]) for sentence, words in sentences]
+
+
+def blob_sentences(text_blob):
+    with instrumentation.current.timer("sentence_split"):
+        sentences = text_blob.sentences
+    with instrumentation.current.timer("lemmatize"):
+        return [(sentence.string, [lemmatize_word(word) for word in sentence.words]) for sentence in sentences]
+
+
+def lemmatize_word(word):
+    return default_lemmatizer.lemmatize(word)
+
+
 class LinkedSentence:
 
-    def __init__(self, sentence: blob_sentence, parent_index):
-        self.words = [LinkedWord(word, self, i) for i, word in enumerate(sentence.words)]
-        self.text = sentence.string
+    def __init__(self, text, lemmas, parent_index):
+        self.words = [LinkedWord(default_lemmatizer.intern(lemma), self, i) for i, lemma in enumerate(lemmas)]
+        self.text = text
         self.parent_index = parent_index
         for word_a, word_b in zip(self.words[:-1], self.words[1:]):
             word_a.next = word_b
@@ -48,14 +107,18 @@ class LinkedSentence:
 
 
 class LinkedWord:
-    def __init__(self, word: blob_word, parent: LinkedSentence, parent_index):
-        self.lemma = word.lemmatize().lower()
+    def __init__(self, lemma_id, parent: LinkedSentence, parent_index):
+        self.lemma_id = lemma_id
         self.next = None
         self.previous = None
         self.index = -1
         self.parent_index = parent_index
         self.parent = parent
 
+    @property
+    def lemma(self):
+        return default_lemmatizer.lemma(self.lemma_id)
+
     @property
     def after(self):
         if self.next is not None:
@@ -76,14 +139,44 @@ class LinkedWord:
         return self.lemma
 
 
-def midpoint(word_a: LinkedWord, word_b: LinkedWord):
-    desired_index = (word_a.index + word_b.index) // 2
-    selected_parent = word_a.parent
-    while len(selected_parent) == 0:
-        selected_parent = selected_parent.next
-    while selected_parent[-1].index < desired_index:
-        selected_parent = selected_parent.next
-    end_offset = selected_parent[-1].index - desired_index
-    if len(selected_parent) < end_offset:
-        return selected_parent[0]
-    return selected_parent[end_offset - 1]
+class CompactText:
+    def __init__(self, sentences):
+        self.lemma_ids = array("i")
+        self.sentence_starts = array("i", [0])
+        self.text_spans = array("i", [0])
+        sentence_texts = []
+        for text, lemmas in sentences:
+            self.lemma_ids.extend(default_lemmatizer.intern(lemma) for lemma in lemmas)
+            self.sentence_starts.append(len(self.lemma_ids))
+            sentence_texts.append(text)
+            self.text_spans.append(self.text_spans[-1] + len(text))
+        self.text = "".join(sentence_texts)
+
+    @property
+    def word_count(self):
+        return len(self.lemma_ids)
+
+    @property
+    def sentence_count(self):
+        return len(self.sentence_starts) - 1
+
+    def lemma_id(self, word_index):
+        return self.lemma_ids[word_index]
+
+    def sentence_of(self, word_index):
+        return bisect_right(self.sentence_starts, word_index) - 1
+
+    def is_sentence_end(self, word_index):
+        return self.sentence_starts[self.sentence_of(word_index) + 1] == word_index + 1
+
+    def sentence_text(self, sentence_index):
+        return self.text[self.text_spans[sentence_index]:self.text_spans[sentence_index + 1]]
+
+    def sentence_lemma_ids(self, sentence_index):
+        return self.lemma_ids[self.sentence_starts[sentence_index]:self.sentence_starts[sentence_index + 1]]
+
+    def sentence_offsets(self):
+        return self.sentence_starts
+
+    def midpoint(self, word_index_a, word_index_b):
+        return (word_index_a + word_index_b) // 2
@@ -1,71 +1,130 @@
+from urllib.parse import unquote
+
 from bs4 import BeautifulSoup
-from textblob import TextBlob
 
-from LinkedListModel import LinkedText
-from data_extraction import PageDistances
+import instrumentation
+import page_identity
+import page_store
+from LinkedListModel import CompactText, text_sentences
+from data_extraction import PageDistances, span_text
 from entity_trees import WalkableEntityTree
-from text_extraction import getInp, get_text
-from utils import lemmatize_term, get_wiki_url
+from lemmatizer import default_lemmatizer
+from page_store import ParsedPage
+from page_identity import href_page_id, normalize_href
+from text_extraction import getInp, extract_document
+from utils import lemmatize_term, get_wiki_url, get_backlinks_url
 
 
 class WikiPage:
 
-    def __init__(self, soup, text_blob, start_term, target_term, discovered_from):
+    def __init__(self, parsed_page, start_term, target_term, discovered_from, url=None):
         self.discovered_from = discovered_from
         self.start_term = start_term
         self.target_term = target_term
-        self.lemmatized_target_term = lemmatize_term(target_term)
-        self.distances = PageDistances(LinkedText(text_blob), start_term)
-        self.links = self.extract_links(soup)
-        if target_term not in self.links:
-            self.links[target_term] = Link(target_term, self.lemmatized_target_term, self.lemmatized_target_term, self.discovered_from)
+        self.lemmatized_target_term = None if target_term is None else lemmatize_term(target_term)
+        self.target_page_id = None if target_term is None else page_identity.page_id(get_wiki_url(target_term))
+        self.page_id = page_identity.page_id(parsed_page.canonical_url or url or get_wiki_url(start_term))
+        self.distances = PageDistances(CompactText(parsed_page.sentences), start_term, self.page_id)
+        self.links = self.extract_links(parsed_page.links)
+
+    @staticmethod
+    def generate(start_term, end_term, discovered_from, url=None):
+        url = get_wiki_url(start_term) if url is None else url
+        return WikiPage.from_parsed_page(load_parsed_page(url), start_term, end_term, discovered_from, url)
 
     @staticmethod
-    def generate(start_term, end_term, discovered_from):
-        url = get_wiki_url(start_term)
-        htext = getInp(url)
-        soup = BeautifulSoup(htext, "html.parser")
-        text = get_text(soup)
-        text_blob = TextBlob(text)
-        if len(text_blob.sentences) > 0:
-            return WikiPage(soup, text_blob, start_term, end_term, discovered_from)
+    def from_parsed_page(parsed_page, start_term, end_term, discovered_from, url=None):
+        if parsed_page is not None and len(parsed_page.sentences) > 0:
+            return WikiPage(parsed_page, start_term, end_term, discovered_from, url)
         return None
 
-    def distance_generator(self):
+    def target_links(self):
+        # the target is matched wherever the text mentions it, linked or not
+        if self.target_term is None:
+            return []
+        return [Link(self.target_term, self.lemmatized_target_term, self.lemmatized_target_term, self.discovered_from,
+                     target_page_id=self.target_page_id)]
+
+    def distance_generator(self, extra_links=()):
         link_locator = WalkableEntityTree()
+        for link in extra_links:
+            link_locator.push_lemmas(link.lemmatized_link_text.split(" "), associated_data=link)
         for link in self.links.values():
             link_locator.push_lemmas(link.lemmatized_link_text.split(" "), associated_data=link)
-        return self.distances.read(link_locator)
+        return self.distances.read_nearest(link_locator)
 
     def __repr__(self):
         return repr(self.distances)
 
-    def extract_links(self, soup):
-        def lemmatized_generator():
-            for link_text, link_href in extract_links_generator(soup):
-                yield link_text, lemmatize_term(link_text), link_href
-        return {lemmatized: Link(link_text, lemmatized, self.lemmatized_target_term, self.discovered_from, link_href=link_href) for
-                link_text, lemmatized, link_href in lemmatized_generator()}
+    def extract_links(self, parsed_links):
+        return {lemmatized: Link(link_text, lemmatized, self.lemmatized_target_term, self.discovered_from,
+                                 link_href=link_href, target_page_id=self.target_page_id) for
+                link_text, lemmatized, link_href in parsed_links}
+
+
+def parse_page(htext):
+    text, raw_links, canonical_href = extract_document(htext)
+    with instrumentation.current.timer("lemmatize"):
+        links = [(link_text, lemmatize_term(link_text), link_href) for link_text, link_href in raw_links]
+    return ParsedPage(text_sentences(text), links, normalize_href(canonical_href))
+
+
+def locate_text(locator):
+    parsed_page = load_parsed_page(locator.page_id)
+    if parsed_page is None:
+        return ""
+    sentence_texts = [text for text, _ in parsed_page.sentences]
+    return span_text(sentence_texts, locator.center_sentence, locator.word_sentence)
+
+
+def load_parsed_page(url):
+    # every title a page was reached by is recorded against its canonical url, so later links through any of them
+    # resolve to the page before it is fetched again
+    url = page_identity.page_id(url)
+    store = page_store.parsed_page_store
+    if store is not None:
+        stored_url = store.resolve(url)
+        parsed_page = store.get(stored_url)
+        if parsed_page is not None:
+            page_identity.page_index.record(url, parsed_page.canonical_url or stored_url)
+            return parsed_page
+        if store.offline:
+            return None
+    htext = getInp(url)
+    if not htext:
+        return None
+    parsed_page = parse_page(htext)
+    canonical_url = page_identity.page_index.record(url, parsed_page.canonical_url or url)
+    if store is not None:
+        store.put(canonical_url, parsed_page)
+        store.alias(url, canonical_url)
+    return parsed_page
 
 
 class Link:
-    def __init__(self, link_text, lemmatized_link_text, lemmatized_target_term, discovered_from, link_href=None):
+    # links are equal when they lead to the same article, whatever their anchor text; page_url is the canonical url
+    # of that article as far as it is known when the link is read
+    def __init__(self, link_text, lemmatized_link_text, lemmatized_target_term, discovered_from, link_href=None,
+                 target_page_id=None):
         self.original_link_text = link_text
         self.lemmatized_link_text = lemmatized_link_text
+        self.link_id = default_lemmatizer.intern(lemmatized_link_text)
         self.link_href = link_href
+        self.page_url = href_page_id(link_href, get_wiki_url(link_text))
         self.discovered_from = discovered_from
         self.lemmatized_target_term = lemmatized_target_term
-        self.text_func = None
-        self.is_target = self.lemmatized_link_text == lemmatized_target_term
+        self.locator = None
+        self.is_target = (lemmatized_target_term is not None and self.link_id == default_lemmatizer.intern(
+            lemmatized_target_term)) or (target_page_id is not None and self.page_url == target_page_id)
 
-    def set_text_func(self, text_func):
-        self.text_func = text_func
+    def set_locator(self, locator):
+        self.locator = locator
         return self
 
     def get_linked_text_generator(self):
         selected = self
         while selected is not None:
-            selected_text = selected.text_func()
+            selected_text = locate_text(selected.locator)
             yield selected_text
             selected = selected.discovered_from
 
@@ -73,10 +132,10 @@ class Link:
         return " ".join(self.get_linked_text_generator())
 
     def __hash__(self):
-        return hash(self.lemmatized_link_text)
+        return hash(self.page_url)
 
     def __eq__(self, other):
-        return self.lemmatized_link_text == other.lemmatized_link_text
+        return self.page_url == other.page_url
 
     def __repr__(self):
         return self.lemmatized_link_text
@@ -92,3 +151,16 @@ def extract_links_generator(soup: BeautifulSoup):
     elif hasattr(soup, "children") and soup.children is not None:
         for child in soup.children:
             yield from extract_links_generator(child)
+
+
+def get_backlink_titles(term, limit=500):
+    soup = BeautifulSoup(getInp(get_backlinks_url(term, limit)), "html.parser")
+    backlink_list = soup.find(id="mw-whatlinkshere-list")
+    if backlink_list is None:
+        return []
+    titles = []
+    for _, link in extract_links_generator(backlink_list):
+        title = unquote(link.split("/wiki/", 1)[-1]).split("#")[0].replace("_", " ")
+        if ":" not in title and title not in titles:
+            titles.append(title)
+    return titles
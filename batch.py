@@ -0,0 +1,210 @@
+import argparse
+import json
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import page_identity
+import page_store
+from WikiModel import Link, WikiPage, load_parsed_page
+from distance_model import PAGE_JUMP_DISADVANTAGE, PriorityQueue
+from lemmatizer import default_lemmatizer
+from page_cache import PageCache
+from page_store import ParsedPageStore
+from text_extraction import set_page_cache
+from utils import get_wiki_url, lemmatize_term
+
+
+class SharedPages:
+
+    def __init__(self, max_pages=4096):
+        self.max_pages = max_pages
+        self.loads = 0
+        self.hits = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, url):
+        with self._lock:
+            if url in self._pages:
+                self._pages.move_to_end(url)
+                self.hits += 1
+                return self._pages[url]
+        parsed_page = load_parsed_page(url)
+        with self._lock:
+            self.loads += 1
+            self._pages[url] = parsed_page
+            while len(self._pages) > self.max_pages:
+                del self._pages[next(iter(self._pages))]
+        return parsed_page
+
+
+class SharedForwardSearch:
+    # one forward expansion from a start term answering every target of that start term; a target is settled once
+    # the cheapest queued link costs at least its best cost, which is when DistanceModel would pop it
+
+    def __init__(self, start_term, target_terms, max_expansions=None):
+        self.start_term = start_term
+        # target page id -> the target terms of that page; a link reaches a target when it leads to the target page
+        # under any anchor, or when its anchor is the target term, as with Link.is_target
+        self.target_terms = {}
+        self.target_lemmas = {}
+        for target_term in target_terms:
+            target_page_id = page_identity.page_id(get_wiki_url(target_term))
+            self.target_terms.setdefault(target_page_id, []).append(target_term)
+            self.target_lemmas[default_lemmatizer.intern(lemmatize_term(target_term))] = target_page_id
+        self.best = {}
+        self.queue = PriorityQueue()
+        self.expanded = set()
+        self.expansions = 0
+        self.max_expansions = max_expansions
+        self.started = False
+
+    @property
+    def done(self):
+        return len(self.target_terms) == 0
+
+    def _target_links(self, discovered_from):
+        return [Link(target_terms[0], lemmatize_term(target_terms[0]), None, discovered_from) for target_terms in
+                self.target_terms.values()]
+
+    def expand(self, parsed_page, term, link, distance, url=None):
+        self.expansions += 1
+        if parsed_page is None or len(parsed_page.sentences) == 0:
+            return
+        page = WikiPage(parsed_page, term, None, link, url)
+        target_links = self._target_links(link)
+        synthetic = {id(target_link) for target_link in target_links}
+        jump = 0 if link is None else PAGE_JUMP_DISADVANTAGE
+        for new_link, additional_distance, locator in page.distance_generator(target_links):
+            new_distance = additional_distance + distance + jump
+            target_page_id = new_link.page_url
+            if target_page_id not in self.target_terms:
+                target_page_id = self.target_lemmas.get(new_link.link_id)
+            if target_page_id in self.target_terms:
+                best = self.best.get(target_page_id)
+                if best is None or new_distance < best[0]:
+                    self.best[target_page_id] = (new_distance, new_link.set_locator(locator))
+            if id(new_link) in synthetic or new_link in self.expanded:
+                continue
+            old_distance = self.queue.get_key(new_link)
+            if old_distance is None or new_distance < old_distance:
+                self.queue.push(new_distance, new_link.set_locator(locator))
+
+    def settle(self):
+        # yields a record for every target that can no longer improve, and for every target once max_expansions
+        # runs out; a path found by then that could still improve is written as not optimal
+        next_key = self.queue.peek(1)[0].key if len(self.queue) > 0 else None
+        out_of_work = next_key is None or (self.max_expansions is not None and self.expansions >= self.max_expansions)
+        for target_page_id in list(self.target_terms):
+            best = self.best.get(target_page_id)
+            if best is not None and (next_key is None or best[0] <= next_key):
+                yield from self._records(target_page_id, best, True)
+            elif out_of_work:
+                yield from self._records(target_page_id, best, False)
+
+    def _records(self, target_page_id, best, optimal):
+        for target_term in self.target_terms.pop(target_page_id):
+            record = {"start": self.start_term, "target": target_term, "found": best is not None,
+                      "expansions": self.expansions}
+            if best is not None:
+                distance, link = best
+                record["optimal"] = optimal
+                path = []
+                selected = link
+                while selected is not None:
+                    path.append(selected.original_link_text)
+                    selected = selected.discovered_from
+                record.update(distance=distance, path=[self.start_term] + path[::-1],
+                              explanation=link.get_linked_text())
+            yield record
+
+    def next_link(self):
+        while len(self.queue) > 0:
+            entry = self.queue.pop()
+            if entry.value not in self.expanded:
+                self.expanded.add(entry.value)
+                return entry
+        return None
+
+
+class BatchRunner:
+
+    def __init__(self, pairs, workers=8, max_expansions=None, max_pages=4096):
+        self.pages = SharedPages(max_pages)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        targets_by_start = OrderedDict()
+        for start_term, target_term in pairs:
+            targets_by_start.setdefault(start_term, []).append(target_term)
+        self.searches = [SharedForwardSearch(start_term, target_terms, max_expansions) for start_term, target_terms in
+                         targets_by_start.items()]
+
+    def run(self):
+        # every round expands the cheapest link of each active search, loading all of their pages together
+        active = list(self.searches)
+        try:
+            while active:
+                jobs = []
+                for search in active:
+                    if not search.started:
+                        jobs.append((search, get_wiki_url(search.start_term), None))
+                        continue
+                    entry = search.next_link()
+                    if entry is not None:
+                        jobs.append((search, entry.value.page_url, entry))
+                urls = list(OrderedDict.fromkeys(url for _, url, _ in jobs))
+                parsed_pages = dict(zip(urls, self.executor.map(self.pages.load, urls)))
+                for search, url, entry in jobs:
+                    if entry is None:
+                        search.started = True
+                        search.expand(parsed_pages[url], search.start_term, None, 0, url)
+                    else:
+                        search.expand(parsed_pages[url], entry.value.original_link_text, entry.value, entry.key,
+                                      url)
+                still_active = []
+                for search in active:
+                    yield from search.settle()
+                    if not search.done:
+                        still_active.append(search)
+                active = still_active
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+def read_pairs(pairs_file):
+    # lines without exactly one start and one target are reported on standard error and skipped, so one bad line
+    # does not stop the batch
+    for line_number, line in enumerate(pairs_file, 1):
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        terms = [term.strip() for term in line.split("\t")]
+        if len(terms) != 2 or not all(terms):
+            print("line %d: expected start<TAB>target, skipped %r" % (line_number, line), file=sys.stderr)
+            continue
+        yield terms[0], terms[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of tab separated start and target terms as JSONL.")
+    parser.add_argument("pairs", help="file with one start<TAB>target pair per line")
+    parser.add_argument("--output", help="JSONL output file, standard output by default")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-expansions", type=int)
+    parser.add_argument("--cache", default="page_cache.sqlite")
+    parser.add_argument("--store", default="page_store")
+    parser.add_argument("--offline", action="store_true", help="only use pages already in the store")
+    arguments = parser.parse_args()
+    set_page_cache(PageCache(arguments.cache, offline=arguments.offline))
+    page_store.set_parsed_page_store(ParsedPageStore(arguments.store, offline=arguments.offline))
+    with open(arguments.pairs, encoding="utf-8") as input_file:
+        batch_pairs = list(read_pairs(input_file))
+    output = sys.stdout if arguments.output is None else open(arguments.output, "w", encoding="utf-8")
+    try:
+        for result in BatchRunner(batch_pairs, arguments.workers, arguments.max_expansions).run():
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+import page_store
+from LinkedListModel import CompactText, LinkedText, text_sentences
+from WikiModel import WikiPage, parse_page
+from data_extraction import PageDistances
+from distance_model import DistanceModel
+from entity_trees import WalkableEntityTree
+from page_cache import LocalPageSource, PageCache
+from queue_benchmark import generate_operations, run_priority_queue
+from text_extraction import extract_page, get_text, set_page_cache
+
+CORPUS_VERSION = 1
+SYLLABLES = ["ka", "lo", "ven", "mar", "ti", "sa", "dor", "el", "un", "ra", "bel", "go", "nis", "tu", "pe", "dra"]
+KINDS = ["River", "Empire", "City", "Mountain", "Dynasty", "Lake", "Road", "Island"]
+FILLER = ["the", "merchant", "travelled", "along", "with", "a", "great", "trade", "route", "and", "was", "known",
+          "for", "its", "old", "new", "market", "after", "before", "many", "years", "in", "of", "to", "army", "king"]
+REGRESSION_THRESHOLD = 0.1
+
+
+def corpus_titles(page_count, generator):
+    titles = []
+    seen = set()
+    while len(titles) < page_count:
+        name = "".join(generator.choice(SYLLABLES) for _ in range(generator.randint(2, 3))).capitalize()
+        title = name if generator.random() < 0.5 else name + " " + generator.choice(KINDS)
+        if title not in seen:
+            seen.add(title)
+            titles.append(title)
+    return titles
+
+
+def corpus_sentence(generator, title, titles):
+    words = [generator.choice(FILLER) for _ in range(generator.randint(6, 18))]
+    for _ in range(generator.randint(0, 3)):
+        other = generator.choice(titles)
+        if generator.random() < 0.6:
+            other = '<a href="/wiki/%s">%s</a>' % (other.replace(" ", "_"), other)
+        words.insert(generator.randint(0, len(words)), other)
+    if generator.random() < 0.4:
+        words.insert(generator.randint(0, len(words)), title)
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def corpus_page(generator, title, titles):
+    paragraphs = []
+    for _ in range(generator.randint(3, 12)):
+        sentences = [corpus_sentence(generator, title, titles) for _ in range(generator.randint(2, 7))]
+        paragraphs.append("<p>%s</p>" % " ".join(sentences))
+    navigation = " ".join('<li><a href="/wiki/%s">%s</a></li>' % (other.replace(" ", "_"), other) for other in
+                          generator.sample(titles, min(5, len(titles))))
+    return ('<html><head><title>%s</title><script>var page = 1;</script></head><body>'
+            '<div id="navigation"><ul>%s</ul></div><div id="content"><h1>%s</h1>%s'
+            '<h2>References</h2><p>Reference list of %s.</p></div></body></html>') % (
+        title, navigation, title, "\n".join(paragraphs), title)
+
+
+def generate_corpus(directory, page_count=200, seed=0):
+    # the same arguments always write the same pages, so results from different runs stay comparable
+    generator = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    titles = corpus_titles(page_count, generator)
+    for title in titles:
+        with open(os.path.join(directory, LocalPageSource.file_name(title)), "w", encoding="utf-8") as page_file:
+            page_file.write(corpus_page(generator, title, titles))
+    return titles
+
+
+def corpus_fingerprint(directory):
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith(".html"):
+            digest.update(file_name.encode("utf-8"))
+            with open(os.path.join(directory, file_name), "rb") as page_file:
+                digest.update(page_file.read())
+    return digest.hexdigest()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(function, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - start)
+    # memory is traced in a separate pass, since tracemalloc slows down every allocation
+    tracemalloc.start()
+    for item in items:
+        function(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies.sort()
+    total = sum(latencies)
+    return {"operations": len(items), "seconds": total, "throughput": len(items) / total if total else 0.0,
+            "p50_ms": percentile(latencies, 0.5) * 1000, "p90_ms": percentile(latencies, 0.9) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000, "peak_memory_bytes": peak}
+
+
+def run_query(pair):
+    model = DistanceModel(pair[0], pair[1])
+    while len(model.queue) > 0 and not model.iterate():
+        pass
+    return model.result
+
+
+def match_links(page):
+    link_locator = WalkableEntityTree()
+    for link in page.links.values():
+        link_locator.push_lemmas(link.lemmatized_link_text.split(" "), associated_data=link)
+    return list(page.distances.read_nearest(link_locator))
+
+
+def run_benchmarks(directory, query_count=20, queue_size=20000, seed=0):
+    source = LocalPageSource(directory)
+    pages = list(source.pages())
+    set_page_cache(PageCache(fetcher=source, max_entries=len(pages) + 1))
+    page_store.set_parsed_page_store(None)
+    titles = [url.rsplit("/wiki/", 1)[1] for url, _ in pages]
+    htexts = [htext for _, htext in pages]
+    parsed_pages = [parse_page(htext) for htext in htexts]
+    texts = [text for text, _ in (extract_page(htext) for htext in htexts)]
+    compact_texts = list(zip(titles, (CompactText(parsed_page.sentences) for parsed_page in parsed_pages)))
+    wiki_pages = [WikiPage(parsed_page, title, titles[0], None) for title, parsed_page in zip(titles, parsed_pages)]
+    generator = random.Random(seed)
+    pairs = [tuple(generator.sample(titles, 2)) for _ in range(query_count)]
+    queue_runs = [generate_operations(queue_size, seed=run) for run in range(5)]
+    benchmarks = [
+        ("get_text", lambda htext: get_text(BeautifulSoup(htext, "html.parser")), htexts),
+        ("extract_page", extract_page, htexts),
+        ("sentence_split_and_lemmatize", text_sentences, texts),
+        ("linked_text", lambda parsed_page: LinkedText(parsed_page.sentences), parsed_pages),
+        ("compact_text", lambda parsed_page: CompactText(parsed_page.sentences), parsed_pages),
+        ("page_distances", lambda item: PageDistances(item[1], item[0]), compact_texts),
+        ("entity_tree_matching", match_links, wiki_pages),
+        ("priority_queue", run_priority_queue, queue_runs),
+        ("query", run_query, pairs),
+    ]
+    return {name: measure(function, items) for name, function, items in benchmarks}
+
+
+def compare(results, baseline):
+    # throughput regressions above REGRESSION_THRESHOLD are reported; latency and memory are shown for context
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["throughput"]:
+            print("%-30s %10.1f ops/s  (no baseline)" % (name, result["throughput"]))
+            continue
+        change = result["throughput"] / previous["throughput"] - 1
+        print("%-30s %10.1f ops/s  %+6.1f%%  p99 %8.3f ms (was %.3f)  peak %.1f MB (was %.1f)" % (
+            name, result["throughput"], change * 100, result["p99_ms"], previous["p99_ms"],
+            result["peak_memory_bytes"] / 2 ** 20, previous["peak_memory_bytes"] / 2 ** 20))
+        if change < -REGRESSION_THRESHOLD:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the search and its subsystems on a frozen local corpus.")
+    parser.add_argument("--corpus", default="benchmark_corpus", help="directory of saved pages, generated if missing")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--output", help="write the results as a JSON baseline")
+    parser.add_argument("--baseline", help="compare against a JSON baseline written by --output")
+    arguments = parser.parse_args()
+    if not os.path.isdir(arguments.corpus):
+        generate_corpus(arguments.corpus, arguments.pages, arguments.seed)
+    report = {"corpus_version": CORPUS_VERSION, "corpus_fingerprint": corpus_fingerprint(arguments.corpus),
+              "python": platform.python_version(), "machine": platform.machine(),
+              "results": run_benchmarks(arguments.corpus, arguments.queries, seed=arguments.seed)}
+    if arguments.baseline is not None:
+        with open(arguments.baseline, encoding="utf-8") as baseline_file:
+            baseline_report = json.load(baseline_file)
+        if baseline_report["corpus_fingerprint"] != report["corpus_fingerprint"]:
+            print("warning: the baseline was measured on a different corpus")
+        regressed = compare(report["results"], baseline_report["results"])
+        print("regressions: %s" % (", ".join(regressed) if regressed else "none"))
+    else:
+        regressed = compare(report["results"], {})
+    if arguments.output is not None:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+    if regressed:
+        raise SystemExit(1)
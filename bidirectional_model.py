@@ -0,0 +1,164 @@
+from collections import deque
+
+import page_identity
+from WikiModel import WikiPage, get_backlink_titles
+from distance_model import PriorityQueue, Entry, PAGE_JUMP_DISADVANTAGE
+from utils import get_wiki_url
+
+
+def page_title(url):
+    return url.split("/wiki/", 1)[1]
+
+
+class BidirectionalDistanceModel:
+
+    def __init__(self, start_term, target_term, backlink_limit=500):
+        self.result = None
+        self.start_term = start_term
+        self.target_term = target_term
+        self.backlink_limit = backlink_limit
+        self.target_url = page_identity.page_id(get_wiki_url(target_term))
+        self.pages_fetched = 0
+        self.forward_fetches = 0
+        self.backward_fetches = 0
+        self.best_cost = float("inf")
+        self.best_meeting = None
+        # page url -> {linked page url: (distance, link)} for every page generated so far, shared by both
+        # sides so that no page is generated twice. a page is always weighed from its own title rather than from
+        # the anchor text that led to it, which the backward side cannot know, so an edge costs the same whichever
+        # side finds it and the stopping bound holds
+        self.page_links = {}
+        start_url = page_identity.page_id(get_wiki_url(start_term))
+        # both sides are keyed by canonical page url, so they meet whatever anchor text each side followed
+        self.forward_costs = {}
+        self.forward_expanded = {start_url}
+        init_entries = [Entry(distance, link) for distance, link in self.links_of(start_url, start_term).values()]
+        self.forward_queue = PriorityQueue(init_entries)
+        # backward records map a page url to (cost to the target, link to the next page on the way there)
+        self.backward_records = {self.target_url: (0, None)}
+        self.backward_queue = PriorityQueue([Entry(0, self.target_url)])
+        self.backward_expanded = set()
+        # (cost, page url, predecessor title) of the backlinks of the last expanded page still to be weighed; they
+        # are weighed one generated page at a time, so a page with many backlinks cannot starve the forward side
+        self.backward_pending = deque()
+        for distance, link in self.forward_queue.items():
+            self.relax_forward(link, distance)
+
+    def generate_page(self, term, discovered_from, url=None):
+        self.pages_fetched += 1
+        return WikiPage.generate(term, self.target_term, discovered_from, url)
+
+    def links_of(self, url, title):
+        links = self.page_links.get(url)
+        if links is None:
+            links = {}
+            page = self.generate_page(title, None, url)
+            if page is not None:
+                for link, distance, locator in page.distance_generator(page.target_links()):
+                    if link.page_url not in links or distance < links[link.page_url][0]:
+                        links[link.page_url] = (distance, link.set_locator(locator))
+                self.page_links[page.page_id] = links
+            self.page_links[url] = links
+        return links
+
+    def update_best(self, cost, forward_link, url):
+        if cost < self.best_cost:
+            self.best_cost = cost
+            self.best_meeting = (forward_link, url)
+
+    def relax_forward(self, link, cost):
+        self.forward_costs[link.page_url] = (cost, link)
+        backward_record = self.backward_records.get(link.page_url)
+        if backward_record is not None:
+            self.update_best(cost + backward_record[0], link, link.page_url)
+
+    def relax_backward(self, url, cost, next_link):
+        old_record = self.backward_records.get(url)
+        if old_record is not None and old_record[0] <= cost:
+            return
+        self.backward_records[url] = (cost, next_link)
+        self.backward_queue.push(cost, url)
+        forward_record = self.forward_costs.get(url)
+        if forward_record is not None:
+            self.update_best(forward_record[0] + cost, forward_record[1], url)
+
+    def expand_forward(self):
+        entry = self.forward_queue.pop()
+        link = entry.value
+        if link.page_url in self.forward_expanded or link.is_target:
+            self.forward_expanded.add(link.page_url)
+            return
+        self.forward_expanded.add(link.page_url)
+        if link.page_url not in self.page_links:
+            self.forward_fetches += 1
+        for additional_distance, new_link in self.links_of(link.page_url, page_title(link.page_url)).values():
+            if new_link.page_url in self.forward_expanded:
+                continue
+            new_link.discovered_from = link
+            new_distance = additional_distance + entry.key + PAGE_JUMP_DISADVANTAGE
+            old_distance = self.forward_queue.get_key(new_link)
+            if old_distance is None or new_distance < old_distance:
+                self.forward_queue.push(new_distance, new_link)
+                self.relax_forward(new_link, new_distance)
+
+    def expand_backward(self):
+        if not self.backward_pending:
+            entry = self.backward_queue.pop()
+            url = entry.value
+            if url in self.backward_expanded:
+                return
+            self.backward_expanded.add(url)
+            self.backward_fetches += 1
+            for title in get_backlink_titles(page_title(url), self.backlink_limit):
+                self.backward_pending.append((entry.key, url, title))
+            return
+        # every page the forward side has not expanded is at least the forward top away from the start
+        forward_key = self.forward_queue.peek(1)[0].key
+        while self.backward_pending:
+            cost, url, title = self.backward_pending.popleft()
+            if forward_key + PAGE_JUMP_DISADVANTAGE + cost >= self.best_cost:
+                continue
+            predecessor = page_identity.page_id(get_wiki_url(title))
+            if predecessor in self.backward_expanded or predecessor in self.forward_expanded:
+                # a page the forward side expanded already offered its link to this page as a meeting point
+                continue
+            fetched = predecessor not in self.page_links
+            if fetched:
+                self.backward_fetches += 1
+            edge = self.links_of(predecessor, title).get(url)
+            if edge is not None:
+                self.relax_backward(predecessor, edge[0] + PAGE_JUMP_DISADVANTAGE + cost, edge[1])
+            if fetched:
+                return
+
+    def finish(self):
+        if self.best_meeting is None:
+            return True
+        forward_link, url = self.best_meeting
+        last_link = forward_link
+        record = self.backward_records.get(url)
+        while record is not None and record[1] is not None:
+            next_link = record[1]
+            next_link.discovered_from = last_link
+            last_link = next_link
+            record = self.backward_records.get(next_link.page_url)
+        self.result = last_link.get_linked_text()
+        return True
+
+    def iterate(self):
+        forward_top = self.forward_queue.peek(1)
+        if not forward_top:
+            return self.finish()
+        forward_key = forward_top[0].key
+        if self.backward_pending:
+            backward_key = self.backward_pending[0][0]
+        else:
+            backward_top = self.backward_queue.peek(1)
+            backward_key = backward_top[0].key if backward_top else float("inf")
+        if forward_key + backward_key >= self.best_cost:
+            return self.finish()
+        if backward_key < float("inf") and self.backward_fetches < self.forward_fetches:
+            self.expand_backward()
+        else:
+            self.expand_forward()
+        return False
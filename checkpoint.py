@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+
+import page_store
+from WikiModel import Link
+from data_extraction import TextLocator
+from distance_model import OVERFLOW_POLICIES, DistanceModel, PriorityQueue, SpillingQueue
+from page_cache import PageCache
+from page_store import ParsedPageStore
+from text_extraction import set_page_cache
+from utils import lemmatize_term
+
+CHECKPOINT_VERSION = 1
+record_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+# one JSON array per line:
+#   ["search", version, start term, target term]
+#   ["link", id, text, lemma, href, page url, is target, parent id, locator page, center sentence, word sentence]
+#   ["distance", link id, distance, queue key]    a push or a decrease of a queued link
+#   ["pop"]                                       the queue popped its top; the pushes that follow came from its page
+#   ["expanded", page url, distance]             distance is null for the start page and redirect targets
+#   ["drop", link id]                             a queued link forgotten to cap the queue
+#   ["forgotten", page url]                       an expanded page with dropped links, in a rewritten log
+#   ["target", link id, distance]                 a cheaper target link
+#   ["done"]
+# replaying the pushes and pops on an empty queue of the kind the search used rebuilds the stopped queue, so even
+# links with equal keys come out in the same order. a resumed search builds its own queue by pushing the queued links
+# in the order the rewritten log lists them, which is what the next replay of that log does
+
+
+class CheckpointState:
+
+    def __init__(self, start_term, target_term, queue=None):
+        self.start_term = start_term
+        self.target_term = target_term
+        self.lemmatized_target_term = lemmatize_term(target_term)
+        self.links = {}
+        # the queue the operations are replayed on, of the kind the resumed search uses
+        self.queue = PriorityQueue() if queue is None else queue
+        # page url -> distance of the queued and expanded links
+        self.distances = {}
+        # link id -> distance it was last pushed at; a spilling queue can hold older copies of a page than the one
+        # distances has, each with its own distance
+        self.pushed_distances = {}
+        # (key, link, distance) of the queued links once the replay is compacted
+        self.compacted = None
+        self.expanded = set()
+        self.forgotten = set()
+        self.best_link = None
+        self.best_distance = float("inf")
+        self.done = False
+        self.records = 0
+
+    def queued(self):
+        # a spilling queue can hold stale copies of a link that was queued again; only the cheapest counts
+        cheapest = {}
+        for key, link in self.queue.items():
+            if key < cheapest.get(link.page_url, (float("inf"),))[0]:
+                cheapest[link.page_url] = (key, link, self.pushed_distances[link.checkpoint_id])
+        return list(cheapest.values())
+
+    def compact(self):
+        # the replayed queue is only needed to list what is queued; the resumed search builds its own from that list
+        self.compacted = self.queued()
+        if isinstance(self.queue, SpillingQueue):
+            self.queue.close()
+        self.queue = None
+
+    def _link(self, record):
+        _, link_id, link_text, lemmatized, link_href, page_url, is_target, parent_id, page_id, center, word = record
+        link = Link(link_text, lemmatized, None, None if parent_id is None else self.links[parent_id], link_href)
+        # the url and the target flag as they were when the link was read; redirects learned since do not move it
+        link.page_url = page_url
+        link.is_target = bool(is_target)
+        link.lemmatized_target_term = self.lemmatized_target_term
+        if page_id is not None:
+            link.set_locator(TextLocator(page_id, center, word))
+        link.checkpoint_id = link_id
+        self.links[link_id] = link
+
+    def apply(self, record):
+        kind = record[0]
+        if kind == "link":
+            self._link(record)
+        elif kind == "distance":
+            link = self.links[record[1]]
+            self.distances[link.page_url] = record[2]
+            self.pushed_distances[record[1]] = record[2]
+            self.queue.push(record[3], link)
+        elif kind == "pop":
+            self.forgotten.discard(self.queue.pop().value.page_url)
+        elif kind == "expanded":
+            self.expanded.add(record[1])
+            if record[2] is not None:
+                self.distances[record[1]] = record[2]
+        elif kind == "drop":
+            link = self.links[record[1]]
+            self.queue.remove(link)
+            del self.distances[link.page_url]
+            self.forgotten.add(link.discovered_from.page_url)
+        elif kind == "forgotten":
+            self.forgotten.add(record[1])
+        elif kind == "target":
+            self.best_link = self.links[record[1]]
+            self.best_distance = record[2]
+        elif kind == "done":
+            self.done = True
+        self.records += 1
+
+    @staticmethod
+    def read(path, queue=None):
+        with open(path, encoding="utf-8") as checkpoint_file:
+            lines = iter(checkpoint_file)
+            header = json.loads(next(lines))
+            if header[:2] != ["search", CHECKPOINT_VERSION]:
+                raise ValueError("%s is not a version %d search checkpoint" % (path, CHECKPOINT_VERSION))
+            state = CheckpointState(header[2], header[3], queue)
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a write cut short by a crash can only be the last line
+                    break
+                state.apply(record)
+        return state
+
+
+class SearchCheckpoint:
+    # an append-only log of a DistanceModel search: each link the search keeps is written once, with its parent and
+    # its locator, and after that only queue operations, expanded pages and better targets are appended; records
+    # are buffered and written every flush_every pops, so a crash loses at most that many pages of work
+
+    def __init__(self, path, flush_every=16, sync=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.sync = sync
+        self.next_id = 0
+        self.pops = 0
+        self.finished = False
+        self.pending = []
+        # where the records of the page being expanded start in pending
+        self.page_start = 0
+        self.checkpoint_file = None
+
+    def restore(self, start_term, target_term, new_queue=PriorityQueue):
+        # the saved state of this search, or None when there is nothing to resume; either way the log is open for
+        # appending afterwards
+        state = None
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            state = CheckpointState.read(self.path, new_queue())
+        if state is not None and state.records == 0:
+            # stopped before the start page was written
+            state = None
+        if state is not None:
+            if (state.start_term, state.target_term) != (start_term, target_term):
+                raise ValueError("%s checkpoints the search from %r to %r" % (self.path, state.start_term,
+                                                                               state.target_term))
+            self.next_id = max(state.links, default=-1) + 1
+            self.finished = state.done
+            state.compact()
+        self._rewrite(state, start_term, target_term)
+        return state
+
+    def _rewrite(self, state, start_term, target_term):
+        # a replayed log is rewritten with only the queue as it stands, in slot order, the best target and the links
+        # they descend from
+        records = [["search", CHECKPOINT_VERSION, start_term, target_term]]
+        if state is not None:
+            queued = state.compacted
+            live = {}
+            for link in [link for _, link, _ in queued] + [state.best_link]:
+                while link is not None and link.checkpoint_id not in live:
+                    live[link.checkpoint_id] = link
+                    link = link.discovered_from
+            records.extend(self._link_record(live[link_id]) for link_id in sorted(live))
+            records.extend(["distance", link.checkpoint_id, distance, key] for key, link, distance in queued)
+            records.extend(["expanded", url, state.distances.get(url)] for url in sorted(state.expanded))
+            records.extend(["forgotten", url] for url in sorted(state.forgotten))
+            if state.best_link is not None:
+                records.append(["target", state.best_link.checkpoint_id, state.best_distance])
+            if state.done:
+                records.append(["done"])
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.writelines(self._line(record) for record in records)
+        os.replace(temporary_path, self.path)
+        self.checkpoint_file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _line(record):
+        return record_encoder.encode(record) + "\n"
+
+    @staticmethod
+    def _link_record(link):
+        parent = link.discovered_from
+        locator = link.locator or (None, None, None)
+        return ["link", link.checkpoint_id, link.original_link_text, link.lemmatized_link_text, link.link_href,
+                link.page_url, int(link.is_target), None if parent is None else parent.checkpoint_id] + list(locator)
+
+    def _link_id(self, link):
+        link_id = getattr(link, "checkpoint_id", None)
+        if link_id is None:
+            if link.discovered_from is not None:
+                self._link_id(link.discovered_from)
+            link_id = link.checkpoint_id = self.next_id
+            self.next_id += 1
+            self.pending.append(self._line(self._link_record(link)))
+        return link_id
+
+    # pushes, pops and expansions are most of the log, so their lines are formatted directly
+    def distance(self, link, distance, key):
+        self.pending.append('["distance",%d,%r,%r]\n' % (self._link_id(link), distance, key))
+
+    def popped(self):
+        # written before anything the popped page adds, so every flush ends between two pages
+        if self.pops % self.flush_every == 0:
+            self.flush()
+        self.pops += 1
+        self.page_start = len(self.pending)
+        self.pending.append('["pop"]\n')
+
+    def expanded(self, url, distance):
+        self.pending.append('["expanded",%s,%s]\n' % (record_encoder.encode(url), record_encoder.encode(distance)))
+
+    def dropped(self, link):
+        self.pending.append('["drop",%d]\n' % self._link_id(link))
+
+    def target(self, link, distance):
+        self.pending.append(self._line(["target", self._link_id(link), distance]))
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self.pending.append(self._line(["done"]))
+        self.flush()
+
+    def flush(self):
+        if self.checkpoint_file is None or not self.pending:
+            return
+        self.checkpoint_file.write("".join(self.pending))
+        self.checkpoint_file.flush()
+        if self.sync:
+            os.fsync(self.checkpoint_file.fileno())
+        self.pending = []
+        self.page_start = 0
+
+    def close(self, interrupted=False):
+        # a search interrupted inside iterate has only logged part of the page it was expanding; that page is
+        # dropped, pop included, and expanded again on resume
+        if interrupted:
+            del self.pending[self.page_start:]
+        self.flush()
+        if self.checkpoint_file is not None:
+            self.checkpoint_file.close()
+            self.checkpoint_file = None
+
+
+def resume(path, flush_every=16, **model_arguments):
+    # continues the search saved at path; the terms come from the checkpoint, the rest from the arguments
+    with open(path, encoding="utf-8") as checkpoint_file:
+        _, _, start_term, target_term = json.loads(checkpoint_file.readline())
+    return DistanceModel(start_term, target_term, checkpoint=SearchCheckpoint(path, flush_every), **model_arguments)
+
+
+def run(model):
+    try:
+        while not model.iterate():
+            pass
+    except BaseException:
+        model.checkpoint.close(interrupted=True)
+        raise
+    model.checkpoint.close()
+    return model
+
+
+def print_status(path):
+    saved = CheckpointState.read(path)
+    print("%s -> %s: %d records, %d pages expanded, %d links queued" % (
+        saved.start_term, saved.target_term, saved.records, len(saved.expanded), len(saved.queued())))
+    chain = []
+    best = saved.best_link
+    while best is not None:
+        chain.append(best.original_link_text)
+        best = best.discovered_from
+    if chain:
+        print("best target at %s%s: %s" % (saved.best_distance, ", done" if saved.done else "", " <- ".join(chain)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a search that can be stopped and resumed from a checkpoint.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start_parser = commands.add_parser("start", help="start a search, or resume it if the checkpoint exists")
+    start_parser.add_argument("start")
+    start_parser.add_argument("target")
+    start_parser.add_argument("checkpoint")
+    resume_parser = commands.add_parser("resume", help="resume the search saved in a checkpoint")
+    resume_parser.add_argument("checkpoint")
+    status_parser = commands.add_parser("status", help="summarize a checkpoint without resuming it")
+    status_parser.add_argument("checkpoint")
+    for command_parser in (start_parser, resume_parser):
+        command_parser.add_argument("--flush-every", type=int, default=16, help="pages popped between writes")
+        command_parser.add_argument("--prefetch-depth", type=int, default=0)
+        command_parser.add_argument("--max-queued", type=int, help="queued links to hold in memory at most")
+        command_parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="spill",
+                                    help="what happens to the links past --max-queued")
+        command_parser.add_argument("--spill-directory", help="where spilled links go, a temporary directory by default")
+        command_parser.add_argument("--cache", default="page_cache.sqlite")
+        command_parser.add_argument("--store", default="page_store")
+        command_parser.add_argument("--offline", action="store_true", help="only use pages already in the store")
+    arguments = parser.parse_args()
+    if arguments.command == "status":
+        print_status(arguments.checkpoint)
+    else:
+        set_page_cache(PageCache(arguments.cache, offline=arguments.offline))
+        page_store.set_parsed_page_store(ParsedPageStore(arguments.store, offline=arguments.offline))
+        if arguments.command == "start":
+            model = DistanceModel(arguments.start, arguments.target, arguments.prefetch_depth,
+                                  checkpoint=SearchCheckpoint(arguments.checkpoint, arguments.flush_every),
+                                  max_queued=arguments.max_queued, overflow=arguments.overflow,
+                                  spill_directory=arguments.spill_directory)
+        else:
+            model = resume(arguments.checkpoint, arguments.flush_every, prefetch_depth=arguments.prefetch_depth,
+                           max_queued=arguments.max_queued, overflow=arguments.overflow,
+                           spill_directory=arguments.spill_directory)
+        try:
+            run(model)
+        except KeyboardInterrupt:
+            raise SystemExit("stopped; resume with: python checkpoint.py resume %s" % arguments.checkpoint)
+        print(model.result_distance)
+        print(model.result)
@@ -0,0 +1,119 @@
+import os
+import random
+import re
+import sys
+import time
+
+from text_extraction import A, B, C, D, E, F, StreamingExtractor, bad_subphrases, check, check_spaces, decide, web
+
+legacy_bad_phrases = ["back to top", "home", "welcome", "you are here:", "itunes", "google", "facebook", "twitter",
+                      "comment"]
+
+
+def legacy_destroy_citations(text):
+    return A.sub(" ", B.sub(" ", C.sub("", D.sub(" ", E.sub(" ", F.sub(" ", text))))))
+
+
+def legacy_check_individual(text):
+    if "°" in text and len(text) < 100:
+        return ""
+    text = legacy_destroy_citations(text.replace("\r", "\n"))
+    stripped = text.lower().strip("\n").strip("\t").strip(" ").strip("\r")
+    if stripped in legacy_bad_phrases:
+        return ""
+    for item in bad_subphrases:
+        if item in stripped:
+            return ""
+    for item in web:
+        if item in text:
+            text = text.replace(item, "")
+    if len(stripped) < 7:
+        return ""
+    if not text[0].isalnum() and not text[0] == " " and not text[0] == "/t" and not text[0] == "\n":
+        return ""
+    lastchr = stripped[len(stripped) - 1]
+    if not lastchr.isalnum() and not (lastchr == "." or lastchr == "?" or lastchr == " "):
+        return ""
+    if stripped.isdigit():
+        return ""
+    endsWithPunc = 0 if stripped[len(stripped) - 1] == '.' else 1
+    length = 1 / (len(stripped) - 6)
+    numSpaces = 1 / (stripped.count(' ') + 1)
+    if numSpaces > 1 / 3:
+        return ""
+    factors = [(endsWithPunc, 2), (length, 1), (numSpaces, 3)]
+    if decide(factors, 0.4):
+        return ""
+    return text
+
+
+def legacy_check(text):
+    texts = text.split("\n")
+    result = ""
+    for item in texts:
+        new = (legacy_check_individual(item) + "\n")
+        result += new
+    return result
+
+
+def legacy_check_spaces(text):
+    obj = re.compile("[\\s \\t\\n]{2,}]")
+    text = obj.sub(" ", text)
+    text = re.compile("[ ]{2,}").sub(" ", text)
+    text = text.replace("\n ", "\n").replace(" \n", "\n")
+    text = re.compile("[\\r\\n]{3,}").sub("\n", text)
+    return text
+
+
+def legacy_clean(text):
+    return legacy_check_spaces(legacy_check(legacy_check_spaces(text)))
+
+
+def clean(text):
+    return check_spaces(check(check_spaces(text)))
+
+
+def outcome(cleaner, text):
+    try:
+        return cleaner(text)
+    except IndexError as error:
+        return repr(error)
+
+
+def generated_lines(count, seed=0):
+    generator = random.Random(seed)
+    pieces = ["Marco Polo", " was ", "born", " in ", "1254", ".", "[1]", "{x}", "]", "(see page 12.)", "ISBN: 12345",
+              "AB12", "3rd ", "\\n", "\\u00e9", "www.", ".com", "://", "et al", "home", "  ", "\t", "\r", "°", "?",
+              "Venice", ":", "(", ")", "{", "}"]
+    return ["".join(generator.choice(pieces) for _ in range(generator.randint(0, 12))) for _ in range(count)]
+
+
+def page_texts(directory):
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".html"):
+            continue
+        with open(os.path.join(directory, file_name), encoding="utf-8", errors="ignore") as page_file:
+            extractor = StreamingExtractor()
+            extractor.feed(page_file.read())
+            extractor.close()
+        yield file_name, extractor.raw_text()
+
+
+def throughput(cleaner, texts):
+    start = time.perf_counter()
+    for text in texts:
+        cleaner(text)
+    elapsed = time.perf_counter() - start
+    return sum(len(text.encode("utf-8")) for text in texts) / elapsed / 2 ** 20
+
+
+if __name__ == "__main__":
+    # tests/test_cleaning.py checks the generated lines and a fixture page; this compares a directory of saved pages
+    if len(sys.argv) != 2:
+        sys.exit("usage: cleaning_benchmark.py <directory of saved pages>")
+    pages = list(page_texts(sys.argv[1]))
+    page_mismatches = [file_name for file_name, text in pages if outcome(legacy_clean, text) != outcome(clean, text)]
+    print("%d pages: %d mismatches %s" % (len(pages), len(page_mismatches), " ".join(page_mismatches)))
+    texts = [text for _, text in pages]
+    print("legacy:   %.2f MB/s" % throughput(legacy_clean, texts))
+    print("compiled: %.2f MB/s" % throughput(clean, texts))
@@ -1,7 +1,18 @@
-from textblob import TextBlob
+from typing import NamedTuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-from LinkedListModel import LinkedText, midpoint
 from entity_trees import WalkableEntityTree
+from lemmatizer import default_lemmatizer
+
+
+class TextLocator(NamedTuple):
+    page_id: str
+    center_sentence: int
+    word_sentence: int
 
 
 class Token:
@@ -13,76 +24,79 @@ class Token:
         self.distance = distance
 
     def __repr__(self):
-        return repr(self.word if self.word is not None else ".") + " " + "(%d)" % self.distance
+        if self.word is None:
+            return repr(".") + " " + "(%d)" % self.distance
+        return repr(default_lemmatizer.lemma(self.segment.text.lemma_id(self.word))) + " " + "(%d)" % self.distance
 
     @property
-    def text_generator(self):
-        def sentence_text_generator():
-            center_sentence = self.segment.center.parent
-            if center_sentence is None:
-                return " ".join(sentence.text for sentence in self.segment.all_sentences)
-            center_sentence_index = center_sentence.parent_index
-            my_sentence = self.word.parent
-            word_sentence_index = my_sentence.parent_index
-            relevant_sentences = self.segment.all_sentences[
-                                 min(center_sentence_index, word_sentence_index): max(center_sentence_index,
-                                                                                      word_sentence_index) + 1]
-            return " ".join(sentence.text for sentence in relevant_sentences)
-
-        return sentence_text_generator
+    def locator(self):
+        text = self.segment.text
+        if self.segment.center is None:
+            return TextLocator(self.segment.page_id, None, None)
+        return TextLocator(self.segment.page_id, text.sentence_of(self.segment.center), text.sentence_of(self.word))
+
+
+def span_text(sentence_texts, center_sentence_index, word_sentence_index):
+    if center_sentence_index is None:
+        return " ".join(sentence_texts)
+    relevant_sentences = sentence_texts[min(center_sentence_index, word_sentence_index):
+                                        max(center_sentence_index, word_sentence_index) + 1]
+    return " ".join(relevant_sentences)
 
 
 class Segment:
 
-    def __init__(self, start, center, end, sentences):
+    def __init__(self, start, center, end, text, page_id=None):
         self.start = start
         self.center = center
         self.end = end
-        self.all_sentences = sentences
+        self.text = text
+        self.page_id = page_id
 
     def tokens(self):
-        selected = self.start
-        end_index = self.end.index
-        center_index = self.center.index if self.center is not None else 1E99
-        while selected is not None and selected.index <= end_index:
-            distance = abs(selected.index - center_index)
+        center_index = self.center if self.center is not None else 1E99
+        for selected in range(self.start, self.end + 1):
+            distance = abs(selected - center_index)
             yield Token(self, distance, word=selected)
-            if selected.next is None:
+            if self.text.is_sentence_end(selected):
                 yield Token(self, distance, end_sentence=True)
-            selected = selected.after
 
     def __repr__(self):
         return " ".join(repr(token) for token in self.tokens())
 
 
 class PageDistances:
-    def __init__(self, linked_text, start_term):
-        self.linked_text = linked_text
+    def __init__(self, text, start_term, page_id=None):
+        self.text = text
         self.start_term = start_term
+        self.page_id = page_id
         self.lemmatized_start_term = None
+        self.start_term_id = None
+        self.centers = []
         self.segments = [segment for segment in self._compute_segments()]
 
     def _find_term_instances(self):
         start_term_finder = WalkableEntityTree()
         self.lemmatized_start_term = start_term_finder.push(self.start_term)
-        for sentence in self.linked_text:
-            start_term_finder.reset()
-            for word in sentence:
-                target_term_list = list(start_term_finder.accept_lemma(word.lemma))
-                if len(target_term_list) == 0:
-                    continue
-                yield word
+        self.start_term_id = default_lemmatizer.intern(self.lemmatized_start_term)
+        for word_index in range(self.text.word_count):
+            if len(start_term_finder.accept_lemma(self.text.lemma_id(word_index))) > 0:
+                self.centers.append(word_index)
+                yield word_index
+            if self.text.is_sentence_end(word_index):
+                start_term_finder.reset()
 
     def _compute_segments(self):
-        start = self.linked_text[0][0]
+        start = 0
         last_center = None
         for center in self._find_term_instances():
             if last_center is not None:
-                center_midpoint = midpoint(last_center, center)
-                yield Segment(start, last_center, center_midpoint, self.linked_text.sentences)
-                start = center_midpoint.after
+                center_midpoint = self.text.midpoint(last_center, center)
+                yield Segment(start, last_center, center_midpoint, self.text, self.page_id)
+                start = center_midpoint + 1
             last_center = center
-        yield Segment(start, last_center, self.linked_text[-1][-1], self.linked_text.sentences)
+        if self.text.word_count > 0:
+            yield Segment(start, last_center, self.text.word_count - 1, self.text, self.page_id)
 
     def read(self, term_locator: WalkableEntityTree):
         for segment in self.segments:
@@ -90,10 +104,66 @@ class PageDistances:
                 if token.word is None:
                     term_locator.reset()
                     continue
-                for potential_result in term_locator.accept_lemma(token.word.lemma):
-                    if potential_result.contained_data.lemmatized_link_text == self.lemmatized_start_term:
+                for potential_result in term_locator.accept_lemma(self.text.lemma_id(token.word)):
+                    if potential_result.contained_data.link_id == self.start_term_id:
                         continue
-                    yield potential_result.contained_data, token.distance + 1, token.text_generator
+                    yield potential_result.contained_data, token.distance + 1, token.locator
+
+    def nearest_distances(self, term_locator: WalkableEntityTree):
+        sentence_starts = numpy.asarray(self.text.sentence_offsets(), dtype=numpy.int64)
+        links = []
+        link_indices = {}
+        match_links = []
+        match_positions = []
+        for sentence_index in range(self.text.sentence_count):
+            sentence_start = int(sentence_starts[sentence_index])
+            for position, link in term_locator.scan(self.text.sentence_lemma_ids(sentence_index)):
+                if link.link_id == self.start_term_id:
+                    continue
+                link_index = link_indices.get(link)
+                if link_index is None:
+                    link_index = link_indices[link] = len(links)
+                    links.append(link)
+                match_links.append(link_index)
+                match_positions.append(sentence_start + position)
+        positions = numpy.array(match_positions, dtype=numpy.int64)
+        match_links = numpy.array(match_links, dtype=numpy.int64)
+        if len(self.centers) == 0:
+            distances = numpy.abs(positions - 1E99)
+            nearest_centers = numpy.full(len(positions), -1, dtype=numpy.int64)
+        else:
+            centers = numpy.array(self.centers, dtype=numpy.int64)
+            right = numpy.searchsorted(centers, positions)
+            left_centers = centers[numpy.maximum(right - 1, 0)]
+            right_centers = centers[numpy.minimum(right, len(centers) - 1)]
+            left_distances = numpy.abs(positions - left_centers)
+            right_distances = numpy.abs(right_centers - positions)
+            use_left = left_distances <= right_distances
+            distances = numpy.where(use_left, left_distances, right_distances)
+            nearest_centers = numpy.where(use_left, left_centers, right_centers)
+        # the first of the closest matches of every link, as the token walk in read would keep it
+        order = numpy.lexsort((positions, distances, match_links))
+        first = numpy.ones(len(order), dtype=bool)
+        first[1:] = match_links[order][1:] != match_links[order][:-1]
+        best = order[first]
+        word_sentences = numpy.searchsorted(sentence_starts, positions[best], side="right") - 1
+        center_sentences = numpy.where(nearest_centers[best] < 0, -1,
+                                       numpy.searchsorted(sentence_starts, nearest_centers[best], side="right") - 1)
+        return links, match_links[best], distances[best], center_sentences, word_sentences
+
+    def read_nearest(self, term_locator: WalkableEntityTree):
+        if numpy is None:
+            yield from self.read(term_locator)
+            return
+        links, link_ids, distances, center_sentences, word_sentences = self.nearest_distances(term_locator)
+        for link_id, distance, center_sentence, word_sentence in zip(link_ids.tolist(), distances.tolist(),
+                                                                     center_sentences.tolist(),
+                                                                     word_sentences.tolist()):
+            if center_sentence < 0:
+                locator = TextLocator(self.page_id, None, None)
+            else:
+                locator = TextLocator(self.page_id, center_sentence, word_sentence)
+            yield links[link_id], distance + 1, locator
 
     def __repr__(self):
         return "\n\n".join("\tSEGMENT:\n" + repr(segment) for segment in self.segments)
@@ -1,5 +1,16 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from collections import deque
+from itertools import islice
+from operator import itemgetter
+
+import instrumentation
 from WikiModel import WikiPage
-from utils import get_wiki_url
+from prefetch import PagePrefetcher
 
 
 class Entry:
@@ -24,15 +35,27 @@ class Entry:
         return repr(self.key) + ": " + repr(self.value)
 
 
+_REMOVED = object()
+
+
 class PriorityQueue:
 
     def __init__(self, init_entries=None):
-        if init_entries is None:
-            init_entries = []
-        self.entries = init_entries
-        self.value_to_index = {entry.value: i for i, entry in enumerate(self.entries)}
-        for i in range(len(self.entries))[::-1]:
-            self.min_heapify(i)
+        self.keys = []
+        self.values = []
+        self.value_to_index = {}
+        self._removed = 0
+        if init_entries is not None:
+            for entry in init_entries:
+                index = self.value_to_index.get(entry.value)
+                if index is None:
+                    self.value_to_index[entry.value] = len(self.keys)
+                    self.keys.append(entry.key)
+                    self.values.append(entry.value)
+                elif entry.key < self.keys[index]:
+                    self.keys[index] = entry.key
+                    self.values[index] = entry.value
+            self._heapify()
 
     @staticmethod
     def left_child(index):
@@ -46,118 +69,568 @@ class PriorityQueue:
     def parent(index):
         return (index - 1) // 2
 
-    def change_key(self, value, new_key):
-        index = self.value_to_index[value]
-        entry = self.entries[index]
-        old_key = entry.key
-        if old_key <= new_key:
-            entry.key = old_key
-        else:
-            self.decrease_key(index, new_key)
+    def _heapify(self):
+        for i in range(len(self.keys) // 2 - 1, -1, -1):
+            self._sift_down(i)
+
+    def _sift_up(self, index):
+        keys = self.keys
+        values = self.values
+        value_to_index = self.value_to_index
+        key = keys[index]
+        value = values[index]
+        while index > 0:
+            parent_index = (index - 1) >> 1
+            parent_key = keys[parent_index]
+            if parent_key <= key:
+                break
+            parent_value = values[parent_index]
+            keys[index] = parent_key
+            values[index] = parent_value
+            if parent_value is not _REMOVED:
+                value_to_index[parent_value] = index
+            index = parent_index
+        keys[index] = key
+        values[index] = value
+        if value is not _REMOVED:
+            value_to_index[value] = index
 
-    def decrease_key(self, index, new_key):
-        target_entry = self.entries[index]
-        target_entry.key = new_key
-        selected_index = index
+    def _sift_down(self, index):
+        keys = self.keys
+        values = self.values
+        value_to_index = self.value_to_index
+        n = len(keys)
+        key = keys[index]
+        value = values[index]
         while True:
-            parent_index = PriorityQueue.parent(selected_index)
-            if parent_index < 0:
-                return
-            parent_entry = self.entries[parent_index]
-            parent_key = parent_entry.key
-            if parent_key < new_key:
-                return
-            self.entries[parent_index] = target_entry
-            self.value_to_index[target_entry.value] = parent_index
-            self.entries[selected_index] = parent_entry
-            self.value_to_index[parent_entry.value] = selected_index
-            selected_index = parent_index
+            child_index = 2 * index + 1
+            if child_index >= n:
+                break
+            right_index = child_index + 1
+            if right_index < n and keys[right_index] < keys[child_index]:
+                child_index = right_index
+            child_key = keys[child_index]
+            if key <= child_key:
+                break
+            child_value = values[child_index]
+            keys[index] = child_key
+            values[index] = child_value
+            if child_value is not _REMOVED:
+                value_to_index[child_value] = index
+            index = child_index
+        keys[index] = key
+        values[index] = value
+        if value is not _REMOVED:
+            value_to_index[value] = index
+
+    def decrease_key(self, value, new_key):
+        index = self.value_to_index[value]
+        if new_key >= self.keys[index]:
+            return False
+        self.keys[index] = new_key
+        self.values[index] = value
+        self._sift_up(index)
+        return True
+
+    def change_key(self, value, new_key):
+        return self.decrease_key(value, new_key)
 
     def push(self, key, value):
         if value in self.value_to_index:
-            old_entry_index = self.value_to_index[value]
-            old_entry = self.entries[old_entry_index]
-            old_key = old_entry.key
-            if old_key < key:
-                self.decrease_key(old_entry_index, key)
-            return
-        index = len(self.entries)
-        self.entries.append(Entry(key, value))
-        self.value_to_index[value] = index
-        self.decrease_key(index, key)
-
-    def min_heapify(self, start_index=0):
-        start_entry = self.entries[start_index]
-        left_index = PriorityQueue.left_child(start_index)
-        right_index = PriorityQueue.right_child(start_index)
-        n = len(self.entries)
-
-        def get_candidates():
-            if left_index < n:
-                yield left_index, self.entries[left_index]
-            if right_index < n:
-                yield right_index, self.entries[right_index]
-            yield start_index, start_entry
-
-        min_index, min_entry = min(get_candidates(), key=lambda candidate: candidate[1].key)
-        if min_index != start_index:
-            self.entries[min_index] = start_entry
-            self.value_to_index[start_entry.value] = min_index
-            self.entries[start_index] = min_entry
-            self.value_to_index[min_entry.value] = start_index
-            self.min_heapify(min_index)
+            return self.decrease_key(value, key)
+        self.keys.append(key)
+        self.values.append(value)
+        self._sift_up(len(self.keys) - 1)
+        return True
+
+    def remove(self, value):
+        index = self.value_to_index.pop(value, None)
+        if index is None:
+            return False
+        self.values[index] = _REMOVED
+        self._removed += 1
+        if self._removed * 2 > len(self.keys):
+            self._compact()
+        return True
+
+    def _compact(self):
+        live = [(key, value) for key, value in zip(self.keys, self.values) if value is not _REMOVED]
+        self.keys = [key for key, _ in live]
+        self.values = [value for _, value in live]
+        self.value_to_index = {value: i for i, value in enumerate(self.values)}
+        self._removed = 0
+        self._heapify()
+
+    def _pop_slot(self):
+        keys = self.keys
+        values = self.values
+        key = keys[0]
+        value = values[0]
+        last_key = keys.pop()
+        last_value = values.pop()
+        if keys:
+            keys[0] = last_key
+            values[0] = last_value
+            self._sift_down(0)
+        return key, value
+
+    def pop(self):
+        while True:
+            key, value = self._pop_slot()
+            if value is not _REMOVED:
+                del self.value_to_index[value]
+                return Entry(key, value)
+            self._removed -= 1
 
     def __contains__(self, item):
         return item in self.value_to_index
 
+    def __len__(self):
+        return len(self.keys) - self._removed
+
     def __repr__(self):
-        return ", ".join(repr(entry) for entry in self.entries)
+        return ", ".join(repr(Entry(key, value)) for key, value in zip(self.keys, self.values)
+                         if value is not _REMOVED)
+
+    def items(self):
+        return [(key, value) for key, value in zip(self.keys, self.values) if value is not _REMOVED]
+
+    def peek(self, count):
+        if count <= 0 or len(self.keys) == 0:
+            return []
+        result = []
+        candidates = [(self.keys[0], 0)]
+        while candidates and len(result) < count:
+            key, index = heapq.heappop(candidates)
+            if self.values[index] is not _REMOVED:
+                result.append(Entry(key, self.values[index]))
+            for child_index in (2 * index + 1, 2 * index + 2):
+                if child_index < len(self.keys):
+                    heapq.heappush(candidates, (self.keys[child_index], child_index))
+        return result
 
     def get_key(self, value):
-        if value in self.value_to_index:
-            return self.entries[self.value_to_index[value]].key
-        return None
+        index = self.value_to_index.get(value)
+        if index is None:
+            return None
+        return self.keys[index]
+
+
+# records pickled, and read back, together
+SPILL_BLOCK = 256
+
+
+class _SpillRun:
+    # a file of pickled blocks of (key, table entries, value) records in key order, read a block at a time; a link
+    # that the values of a block were discovered from is written once for the block
+
+    def __init__(self, path, count):
+        self.path = path
+        self.unread = count
+        self.run_file = open(path, "rb")
+        self.buffer = deque()
+        self._fill(1)
+
+    def _fill(self, count):
+        while len(self.buffer) < count and self.unread > 0:
+            block = pickle.load(self.run_file)
+            self.buffer.extend(block)
+            self.unread -= len(block)
+
+    def head_key(self):
+        return self.buffer[0][0]
 
     def pop(self):
-        first_entry = self.entries[0]
-        self.entries[0] = self.entries[-1]
-        del self.entries[-1]
-        self.min_heapify()
-        return first_entry
+        record = self.buffer.popleft()
+        if not self.buffer:
+            self._fill(1)
+        return record
+
+    def peek(self, count):
+        self._fill(count)
+        return [self.buffer[i] for i in range(min(count, len(self.buffer)))]
+
+    def consume(self):
+        while self.buffer:
+            yield self.pop()
+
+    def records(self):
+        # the remaining records without consuming them
+        yield from list(self.buffer)
+        with open(self.path, "rb") as run_file:
+            run_file.seek(self.run_file.tell())
+            unread = self.unread
+            while unread > 0:
+                block = pickle.load(run_file)
+                unread -= len(block)
+                yield from block
+
+    def __len__(self):
+        return len(self.buffer) + self.unread
+
+    def close(self):
+        self.run_file.close()
+        os.remove(self.path)
+
+
+class SpillingQueue:
+    # a PriorityQueue holding at most max_entries in memory: when it overflows, its worse half is written to a
+    # sorted run on disk, and pop takes the smallest of the queue's top and the heads of the runs, so keys come out
+    # in the same order as from an unbounded queue. runs are merged while the newest is at least half the size of
+    # the one before it, which keeps their number logarithmic in the spilled entries. a Link is written with the
+    # links it was discovered from and with its entries in tables, dicts keyed by page url that its owner keeps per
+    # queued link; they are put back when the link is popped, so nothing stays in memory for a spilled link. a push
+    # of a spilled value queues it again instead of decreasing the spilled copy; DistanceModel skips that copy when
+    # it comes out later, since its page is expanded by then
+
+    def __init__(self, max_entries, directory=None, init_entries=None, tables=()):
+        self.max_entries = max_entries
+        self.spill_directory = directory
+        self.tables = tables
+        # created on the first spill and removed with the queue, even one that is never closed
+        self.directory = None
+        self._remove_directory = None
+        self.queue = PriorityQueue()
+        self.runs = []
+        self.run_count = 0
+        # pushed one at a time, so that pushing the same entries into a new queue builds the same runs
+        for entry in init_entries or ():
+            self.push(entry.key, entry.value)
+
+    def _encode(self, key, value):
+        return key, tuple(table.pop(value.page_url, None) for table in self.tables), value
+
+    def _write_run(self, records):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="frontier-", dir=self.spill_directory)
+            self._remove_directory = weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True)
+        path = os.path.join(self.directory, "run-%d" % self.run_count)
+        self.run_count += 1
+        count = 0
+        records = iter(records)
+        with open(path, "wb") as run_file:
+            block = list(islice(records, SPILL_BLOCK))
+            while block:
+                pickle.dump(block, run_file, pickle.HIGHEST_PROTOCOL)
+                count += len(block)
+                block = list(islice(records, SPILL_BLOCK))
+        return _SpillRun(path, count)
+
+    def _spill_if_full(self):
+        if len(self.queue) <= self.max_entries:
+            return
+        items = sorted(self.queue.items(), key=itemgetter(0))
+        kept = self.max_entries // 2
+        self.queue = PriorityQueue([Entry(key, value) for key, value in items[:kept]])
+        self.runs.append(self._write_run(self._encode(key, value) for key, value in items[kept:]))
+        instrumentation.current.count("queue_spilled", len(items) - kept)
+        while len(self.runs) > 1 and 2 * len(self.runs[-1]) >= len(self.runs[-2]):
+            newer = self.runs.pop()
+            older = self.runs.pop()
+            self.runs.append(self._write_run(heapq.merge(older.consume(), newer.consume(), key=itemgetter(0))))
+            older.close()
+            newer.close()
+
+    def push(self, key, value):
+        pushed = self.queue.push(key, value)
+        self._spill_if_full()
+        return pushed
+
+    def pop(self):
+        run = min(self.runs, key=_SpillRun.head_key, default=None)
+        if run is not None and (len(self.queue) == 0 or run.head_key() < self.queue.peek(1)[0].key):
+            record = run.pop()
+            if len(run) == 0:
+                self.runs.remove(run)
+                run.close()
+            key, table_entries, value = record
+            for table, table_entry in zip(self.tables, table_entries):
+                if table_entry is not None:
+                    table[value.page_url] = table_entry
+            return Entry(key, value)
+        return self.queue.pop()
+
+    def peek(self, count):
+        # on equal keys the in-memory entries come first, as they do in pop
+        candidates = self.queue.peek(count)
+        for run in self.runs:
+            candidates.extend(Entry(record[0], record[2]) for record in run.peek(count))
+        return heapq.nsmallest(count, candidates, key=lambda entry: entry.key)
+
+    def items(self):
+        yield from self.queue.items()
+        for run in self.runs:
+            for record in run.records():
+                yield record[0], record[2]
+
+    def __len__(self):
+        return len(self.queue) + sum(len(run) for run in self.runs)
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        if self._remove_directory is not None:
+            self._remove_directory()
+            self.directory = None
 
 
 PAGE_JUMP_DISADVANTAGE = 5
+OVERFLOW_POLICIES = ("spill", "drop")
 
 
 class DistanceModel:
 
-    def __init__(self, start_term, target_term):
+    def __init__(self, start_term, target_term, prefetch_depth=0, workers=4, requests_per_second=None,
+                 parse_workers=0, heuristic=None, heuristic_weight=1, checkpoint=None, max_queued=None,
+                 overflow="spill", spill_directory=None):
+        # with a heuristic the queue is keyed by distance + heuristic_weight * estimate, and a found path costs at
+        # most heuristic_weight times the shortest one. max_queued caps the queued links held in memory: "spill"
+        # moves the rest to sorted runs in spill_directory and expands pages in the same order, "drop" forgets the
+        # worst links and expands their page again once the cheapest of them comes up
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of %s, not %r" % (", ".join(OVERFLOW_POLICIES), overflow))
         self.result = None
-        start_page = WikiPage.generate(start_term, target_term, None)
+        self.result_distance = None
+        # the cheapest target link seen while scanning pages; it never enters the queue, it bounds it
+        self.best_distance = float("inf")
+        self.best_link = None
         self.start_term = start_term
         self.target_term = target_term
-        init_entries = [Entry(distance, link.set_text_func(text_func)) for link, distance, text_func in
-                        start_page.distance_generator()]
-        self.queue = PriorityQueue(init_entries)
+        self.heuristic = heuristic
+        self.heuristic_weight = heuristic_weight
+        # both keyed by page url, so that a link only stays in memory while it is queued; a spilling search keeps
+        # them for the links it holds in memory and for no expanded page, the spilled links carry their own
+        self.estimates = {}
+        self.distances = {}
+        self.pruned = 0
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self.spilling = max_queued is not None and overflow == "spill"
+        self.spill_directory = spill_directory
+        # expanded pages whose dropped links are waiting for the page to come up again
+        self.forgotten = set()
+        # a checkpoint.SearchCheckpoint that the search state is logged to, and restored from when it has any
+        self.checkpoint = checkpoint
+        if heuristic is not None:
+            heuristic.prepare(target_term)
+        # canonical page urls; a page reached through a redirect is closed under the url it resolved to as well
+        self.expanded = set()
+        saved = None if checkpoint is None else checkpoint.restore(start_term, target_term, self.new_queue)
+        if saved is None:
+            self.start()
+        else:
+            self.restore(saved)
+        self.prefetch_depth = prefetch_depth
+        self.prefetcher = None
+        if prefetch_depth > 0:
+            self.prefetcher = PagePrefetcher(target_term, workers, requests_per_second, parse_workers)
 
-    def process_link(self, link, distance):
-        print("Processing", link, "at distance", distance)
-        if link.is_target:
-            self.result = link.get_linked_text()
+    def start(self):
+        start_page = WikiPage.generate(self.start_term, self.target_term, None)
+        with instrumentation.current.timer("link_match"):
+            matches = []
+            if start_page is not None:
+                matches = list(start_page.distance_generator(start_page.target_links()))
+        # page url -> the entry of its cheapest link, in the order the pages were first linked
+        init_entries = {}
+        with instrumentation.current.timer("queue_update"):
+            for link, distance, locator in matches:
+                if link.is_target:
+                    self.offer_target(link, distance, locator)
+                elif link.page_url not in self.distances or distance < self.distances[link.page_url]:
+                    self.distances[link.page_url] = distance
+                    init_entries[link.page_url] = Entry(self.priority(link, distance), link.set_locator(locator))
+            queued_entries = []
+            for entry in init_entries.values():
+                if not self.prunable(entry.value):
+                    queued_entries.append(entry)
+                elif self.spilling:
+                    self.release(entry.value.page_url)
+            if self.checkpoint is not None and self.spilling:
+                # logged in the order they are pushed, and before, since a link that is spilled takes its distance
+                # and checkpoint id with it
+                for entry in queued_entries:
+                    self.checkpoint.distance(entry.value, self.distances[entry.value.page_url], entry.key)
+            self.queue = self.new_queue(queued_entries, (self.distances, self.estimates))
+        if start_page is not None:
+            self.mark_expanded(start_page.page_id)
+        if self.checkpoint is not None:
+            if not self.spilling:
+                # pushing a heap's slots in order rebuilds it slot for slot
+                for key, link in self.queue.items():
+                    self.checkpoint.distance(link, self.distances[link.page_url], key)
+            self.checkpoint.flush()
+
+    def restore(self, saved):
+        # picks up a checkpointed search without fetching anything. the queue is built again from the compacted log,
+        # in the order the log now lists it, so that the next replay of the log builds the same queue
+        self.expanded = saved.expanded
+        self.forgotten = saved.forgotten
+        if saved.best_link is not None:
+            self.best_link = saved.best_link
+            self.best_distance = saved.best_distance
+        self.distances = {} if self.spilling else saved.distances
+        self.queue = self.new_queue(tables=(self.distances, self.estimates))
+        for key, link, distance in saved.compacted:
+            self.distances[link.page_url] = distance
+            self.queue.push(key, link)
+        instrumentation.current.event("resumed", expanded=len(self.expanded), queued=len(self.queue))
+
+    def new_queue(self, init_entries=None, tables=()):
+        # tables are handed to a spilling queue, which moves the entries of the links it spills into their records
+        if self.spilling:
+            return SpillingQueue(self.max_queued, self.spill_directory, init_entries, tables)
+        return PriorityQueue(init_entries)
+
+    def release(self, url):
+        # what a spilling search knows of a page that no link in memory is queued for
+        self.distances.pop(url, None)
+        self.estimates.pop(url, None)
+
+    def generate_page(self, link):
+        if self.prefetcher is not None:
+            return self.prefetcher.take(link)
+        return WikiPage.generate(link.original_link_text, self.target_term, link, link.page_url)
+
+    def priority(self, link, distance):
+        if self.heuristic is None:
+            return distance
+        return distance + self.heuristic_weight * self.estimate(link)
+
+    def estimate(self, link):
+        estimate = self.estimates.get(link.page_url)
+        if estimate is None:
+            estimate = self.estimates[link.page_url] = self.heuristic.estimate(link)
+        return estimate
+
+    def offer_target(self, link, distance, locator):
+        if distance < self.best_distance:
+            self.best_distance = distance
+            self.best_link = link.set_locator(locator)
+            if self.checkpoint is not None:
+                self.checkpoint.target(link, distance)
+
+    def prunable(self, link):
+        # nothing reached through this link can beat the best target, even by the unweighted lower bound
+        distance = self.distances[link.page_url]
+        if self.heuristic is not None:
+            distance += self.estimate(link)
+        if distance >= self.best_distance:
+            self.pruned += 1
             return True
-        new_page = WikiPage.generate(link.original_link_text, self.target_term, link)
+        return False
+
+    def mark_expanded(self, url, distance=None):
+        self.expanded.add(url)
+        if self.checkpoint is not None:
+            self.checkpoint.expanded(url, distance)
+
+    def process_link(self, link, distance):
+        instrumentation.current.event("processing", link=link, distance=distance)
+        expanded_again = link.page_url in self.forgotten
+        if expanded_again:
+            self.forgotten.discard(link.page_url)
+            instrumentation.current.count("pages_expanded_again")
+        elif link.page_url in self.expanded:
+            return False
+        else:
+            self.mark_expanded(link.page_url, distance)
+        new_page = self.generate_page(link)
         if new_page is None:
             return False
-        for link, additional_distance, text_func in new_page.distance_generator():
-            new_distance = additional_distance + distance + PAGE_JUMP_DISADVANTAGE
-            old_distance = self.queue.get_key(link)
-            if old_distance is None:
-                self.queue.push(new_distance, link.set_text_func(text_func))
-            elif new_distance < old_distance:
-                self.queue.change_key(link, new_distance)
+        if new_page.page_id != link.page_url and not expanded_again:
+            if new_page.page_id in self.expanded:
+                instrumentation.current.count("redirects_to_expanded")
+                return False
+            self.mark_expanded(new_page.page_id)
+        with instrumentation.current.timer("link_match"):
+            matches = list(new_page.distance_generator(new_page.target_links()))
+        pushed = decreased = 0
+        with instrumentation.current.timer("queue_update"):
+            for link, additional_distance, locator in matches:
+                new_distance = additional_distance + distance + PAGE_JUMP_DISADVANTAGE
+                if link.is_target:
+                    self.offer_target(link, new_distance, locator)
+                    continue
+                if link.page_url in self.expanded:
+                    continue
+                old_distance = self.distances.get(link.page_url)
+                if old_distance is None or new_distance < old_distance:
+                    self.distances[link.page_url] = new_distance
+                    if self.prunable(link):
+                        if old_distance is None and self.spilling:
+                            self.release(link.page_url)
+                        continue
+                    key = self.priority(link, new_distance)
+                    link.set_locator(locator)
+                    # logged first, so that the link has its checkpoint id should the push spill it
+                    if self.checkpoint is not None:
+                        self.checkpoint.distance(link, new_distance, key)
+                    self.queue.push(key, link)
+                    if old_distance is None:
+                        pushed += 1
+                    else:
+                        decreased += 1
+        instrumentation.current.count("links_pushed", pushed)
+        instrumentation.current.count("links_decreased", decreased)
+        if self.max_queued is not None and self.overflow == "drop" and len(self.queue) > self.max_queued:
+            self.drop_worst()
         return False
 
+    def drop_worst(self):
+        # SMA*-style: the worst queued links are forgotten, down to three quarters of max_queued so that dropping is
+        # amortized, and the page each was found on is queued again at the cheapest key it lost. links from the start
+        # page, pages queued again and links at the top key are never dropped, so the next pop always makes progress
+        top_key = self.queue.peek(1)[0].key
+        candidates = [(key, link) for key, link in self.queue.items() if key > top_key and
+                      link.discovered_from is not None and link.page_url not in self.expanded]
+        dropped = heapq.nlargest(len(self.queue) - self.max_queued * 3 // 4, candidates, key=itemgetter(0))
+        lost = {}
+        for key, link in dropped:
+            self.queue.remove(link)
+            del self.distances[link.page_url]
+            self.estimates.pop(link.page_url, None)
+            if self.checkpoint is not None:
+                self.checkpoint.dropped(link)
+            parent = link.discovered_from
+            if key < lost.get(parent.page_url, (None, float("inf")))[1]:
+                lost[parent.page_url] = (parent, key)
+        for parent, key in lost.values():
+            self.forgotten.add(parent.page_url)
+            if self.queue.push(key, parent) and self.checkpoint is not None:
+                self.checkpoint.distance(parent, self.distances[parent.page_url], key)
+        instrumentation.current.count("links_dropped", len(dropped))
+
+    def finish(self):
+        if self.best_link is not None:
+            self.result = self.best_link.get_linked_text()
+            self.result_distance = self.best_distance
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        instrumentation.current.count("links_pruned", self.pruned)
+        if isinstance(self.queue, SpillingQueue):
+            self.queue.close()
+        if self.checkpoint is not None:
+            self.checkpoint.finish()
+        return True
+
     def iterate(self):
-        print(self.queue)
-        entry = self.queue.pop()
-        return self.process_link(entry.value, entry.key)
+        # the search is over once no queued link can lead to a target cheaper than the best one already scanned
+        top = self.queue.peek(1)
+        if not top or top[0].key >= self.best_distance:
+            return self.finish()
+        with instrumentation.current.timer("queue_pop"):
+            entry = self.queue.pop()
+        if self.checkpoint is not None:
+            self.checkpoint.popped()
+        instrumentation.current.gauge("queue_size", len(self.queue))
+        if self.prefetcher is not None:
+            upcoming = [upcoming_entry.value for upcoming_entry in self.queue.peek(self.prefetch_depth)]
+            self.prefetcher.prefetch([entry.value] + upcoming)
+        if self.spilling:
+            # a stale copy of an expanded page finds no distance, but it is skipped before one is needed
+            distance = self.distances.get(entry.value.page_url)
+            self.release(entry.value.page_url)
+            return self.process_link(entry.value, distance)
+        return self.process_link(entry.value, self.distances[entry.value.page_url])
@@ -1,68 +1,7 @@
-from typing import NamedTuple
+from collections import deque
 
-from textblob import TextBlob
-
-
-class SimpleLinkedListNode:
-
-    def __init__(self, value):
-        self.value = value
-        self.next = None
-        self.previous = None
-
-    def replace_val(self, new_val):
-        self.value = new_val
-
-
-class SimpleLinkedList:
-
-    def __init__(self):
-        self._head = None
-        self._tail = None
-
-    def append(self, val):
-        new_node = SimpleLinkedListNode(val)
-        if self._head is None:
-            self._head = new_node
-            self._tail = new_node
-        else:
-            new_node.previous = self._tail
-            self._tail.next = new_node
-
-    def walk(self):
-        current_node_record = [None]
-
-        def remove():
-            current_node = current_node_record[0]
-            if current_node.previous is None:
-                self._head = current_node.next
-                if self._head is None:
-                    self._tail = None
-                    current_node_record[0] = None
-                else:
-                    current_node.next.previous = None
-                    current_node_record[0] = current_node.next
-            else:
-                current_node_record[0] = current_node.next
-                if current_node.next is None:
-                    self._tail = current_node.previous
-                current_node.previous.next = current_node.next
-
-        def replace(new_val):
-            current_node_record[0].replace_val(new_val)
-
-        def iterate():
-            current_node = current_node_record[0]
-            if current_node is None:
-                current_node = self._head
-            else:
-                current_node = current_node.next
-            if current_node is None:
-                return
-            current_node_record[0] = current_node
-            yield current_node.value
-
-        return remove, replace, iterate()
+import tokenizer
+from lemmatizer import default_lemmatizer
 
 
 class EntityTreeNode:
@@ -70,6 +9,8 @@ class EntityTreeNode:
         self._children = {}
         self.parent = None
         self.contained_data = None
+        self.fail = None
+        self.outputs = ()
 
     def back_trace(self):
         if self.parent is None:
@@ -77,65 +18,85 @@ class EntityTreeNode:
         else:
             yield from self.parent.back_trace()
 
-    def push(self, lemma_list, contained_data, lemma_list_index=0):
+    def push(self, lemma_list, contained_data):
         if len(lemma_list) == 0:
             return
-        lemma_selected = lemma_list[lemma_list_index]
-        selected_node = None
-        if lemma_selected in self._children:
-            selected_node = self._children[lemma_selected]
-        else:
-            selected_node = EntityTreeNode()
-            self._children[lemma_selected] = selected_node
-            selected_node.parent = self
-        new_index = lemma_list_index + 1
-        if new_index == len(lemma_list):
-            selected_node.contained_data = contained_data
-            return
-        selected_node.push(lemma_list, contained_data, new_index)
+        selected_node = self
+        for lemma_selected in lemma_list:
+            next_node = selected_node._children.get(lemma_selected)
+            if next_node is None:
+                next_node = EntityTreeNode()
+                next_node.parent = selected_node
+                selected_node._children[lemma_selected] = next_node
+            selected_node = next_node
+        selected_node.contained_data = contained_data
 
     def traverse(self, lemma):
-        if lemma in self._children:
-            return self._children[lemma]
-        else:
-            return None
+        return self._children.get(lemma)
 
 
 class WalkableEntityTree:
 
     def __init__(self):
-        self._root = None
-        self._potential_terms_queue = SimpleLinkedList()
+        self._root = EntityTreeNode()
+        self._state = self._root
+        self._compiled = True
 
     def push(self, term, associated_data=True):
-        term_blob = TextBlob(term)
-        lemmas = [word.lemmatize().lower() for word in term_blob.words]
+        lemmas = [default_lemmatizer.lemmatize(word) for word in tokenizer.default_tokenizer.words(term)]
         return self.push_lemmas(lemmas, associated_data)
 
     def push_lemmas(self, lemmas, associated_data=True):
-        if self._root is None:
-            self._root = EntityTreeNode()
-        self._root.push(lemmas, associated_data)
+        self._root.push([default_lemmatizer.intern(lemma) for lemma in lemmas], associated_data)
+        self._compiled = False
         return " ".join(lemmas)
 
-    def accept_lemma(self, lemma):
-        potential_branch = self._root.traverse(lemma)
-        new_branch_exists = potential_branch is not None
-        if new_branch_exists and potential_branch.contained_data is not None:
-            yield potential_branch
-        remover, replacer, iterator = self._potential_terms_queue.walk()
-        for branch in iterator:
-            new_branch = branch.traverse(lemma)
-            if new_branch is None:
-                remover()
-            else:
-                replacer(new_branch)
-                if new_branch.contained_data is not None:
-                    yield new_branch
-        if new_branch_exists:
-            self._potential_terms_queue.append(potential_branch)
+    def compile(self):
+        # breadth first, so every failure target has its outputs before the nodes falling back to it
+        root = self._root
+        root.fail = root
+        root.outputs = ()
+        pending = deque()
+        for child in root._children.values():
+            child.fail = root
+            pending.append(child)
+        while pending:
+            node = pending.popleft()
+            own_output = (node,) if node.contained_data is not None else ()
+            node.outputs = own_output + node.fail.outputs
+            for lemma, child in node._children.items():
+                fallback = node.fail
+                while fallback is not root and lemma not in fallback._children:
+                    fallback = fallback.fail
+                child.fail = fallback._children.get(lemma, root)
+                pending.append(child)
+        self._state = root
+        self._compiled = True
+
+    def _step(self, state, lemma_id):
+        root = self._root
+        while True:
+            next_state = state._children.get(lemma_id)
+            if next_state is not None:
+                return next_state
+            if state is root:
+                return root
+            state = state.fail
+
+    def accept_lemma(self, lemma_id):
+        if not self._compiled:
+            self.compile()
+        self._state = self._step(self._state, lemma_id)
+        return self._state.outputs
+
+    def scan(self, lemma_ids):
+        if not self._compiled:
+            self.compile()
+        state = self._root
+        for position, lemma_id in enumerate(lemma_ids):
+            state = self._step(state, lemma_id)
+            for node in state.outputs:
+                yield position, node.contained_data
 
     def reset(self):
-        self._potential_terms_queue = SimpleLinkedList()
-
-
+        self._state = self._root
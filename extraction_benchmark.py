@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from WikiModel import extract_links_generator
+from text_extraction import extract_page, get_text
+
+
+def extract_with_soup(htext):
+    soup = BeautifulSoup(htext, "html.parser")
+    return get_text(soup), list(extract_links_generator(soup))
+
+
+def measure(extractor, htext):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = extractor(htext)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1]
+    totals = {extract_with_soup: [0, 0], extract_page: [0, 0]}
+    mismatches = []
+    page_count = 0
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".html"):
+            continue
+        with open(os.path.join(directory, file_name), encoding="utf-8", errors="ignore") as page_file:
+            htext = page_file.read()
+        page_count += 1
+        results = {}
+        for extractor, total in totals.items():
+            results[extractor], elapsed, peak = measure(extractor, htext)
+            total[0] += elapsed
+            total[1] = max(total[1], peak)
+        if results[extract_with_soup] != results[extract_page]:
+            mismatches.append(file_name)
+    soup_time, soup_peak = totals[extract_with_soup]
+    stream_time, stream_peak = totals[extract_page]
+    print("%d pages, %d mismatches %s" % (page_count, len(mismatches), " ".join(mismatches)))
+    print("BeautifulSoup: %.3fs, peak %.1f MB" % (soup_time, soup_peak / 2 ** 20))
+    print("streaming:     %.3fs, peak %.1f MB (%.1fx faster)" % (stream_time, stream_peak / 2 ** 20,
+                                                                 soup_time / stream_time))
@@ -0,0 +1,64 @@
+import argparse
+import time
+import urllib.request
+from urllib.parse import quote
+
+from http_client import DEFAULT_USER_AGENT, HttpClient
+from page_cache import LocalPageSource
+from page_server import PageServer
+
+
+def fetch_with_urllib(url):
+    # the fetch layer before HttpClient: a new connection per page and no compression
+    request = urllib.request.Request(url)
+    request.add_header("User-Agent", DEFAULT_USER_AGENT)
+    body = urllib.request.urlopen(request).read()
+    body.decode("utf-8", errors="ignore")
+    return len(body)
+
+
+def timed(fetch, urls):
+    received = 0
+    start = time.perf_counter()
+    for url in urls:
+        received += fetch(url)
+    return time.perf_counter() - start, received
+
+
+def report(name, urls, elapsed, received, server, connections_before):
+    print("%-12s %7.1f pages/s  %7.2f ms/page  %8.1f KB received  %4d connections" % (
+        name, len(urls) / elapsed, elapsed / len(urls) * 1000, received / 1024,
+        server.counters["connections"] - connections_before))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fetch layers against a local stand-in server.")
+    parser.add_argument("directory", help="directory of saved pages, as written by benchmark.py or page_cache")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the server adds to every response")
+    parser.add_argument("--rounds", type=int, default=3)
+    arguments = parser.parse_args()
+    server = PageServer(arguments.directory, latency=arguments.latency).start()
+    try:
+        titles = [url.rsplit("/wiki/", 1)[1] for url, _ in LocalPageSource(arguments.directory).pages()]
+        urls = [server.base_url + quote(title) for title in titles] * arguments.rounds
+        client = HttpClient()
+        validators = {}
+
+        def fetch_with_client(url):
+            response = client.get(url)
+            validators[url] = response.validators
+            return response.bytes_received
+
+        def revalidate_with_client(url):
+            response = client.get(url, validators[url])
+            assert response.not_modified
+            return response.bytes_received
+
+        for name, fetch in [("urllib", fetch_with_urllib), ("keep-alive", fetch_with_client),
+                            ("revalidate", revalidate_with_client)]:
+            connections = server.counters["connections"]
+            elapsed, received = timed(fetch, urls)
+            report(name, urls, elapsed, received, server, connections)
+        client.close()
+    finally:
+        server.stop()
@@ -0,0 +1,85 @@
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+
+from WikiModel import Link
+from data_extraction import TextLocator
+from distance_model import PAGE_JUMP_DISADVANTAGE, PriorityQueue, SpillingQueue
+
+
+def page_links(parent, generator, fanout, page_count):
+    # links shaped like the ones a page adds: a title, its lemma, an href and a locator into the parent page
+    links = []
+    for _ in range(fanout):
+        title = "Page %d" % generator.randrange(page_count)
+        link = Link(title, title.lower(), "target", parent, "/wiki/" + title.replace(" ", "_"))
+        links.append(link.set_locator(TextLocator(parent.page_url, generator.randrange(200), generator.randrange(200))))
+    return links
+
+
+def run_search(queue, distances, expansions, fanout, page_count, seed):
+    # the queue operations of a DistanceModel search without the pages: pop the cheapest link, then push the links
+    # of its page that are new or got cheaper. like DistanceModel, the search keeps no distance for a link a
+    # spilling queue spilled or popped
+    generator = random.Random(seed)
+    start = Link("Start", "start", "target", None, "/wiki/Start")
+    spilling = isinstance(queue, SpillingQueue)
+    expanded = {start.page_url}
+    popped = []
+    for link in page_links(start, generator, fanout, page_count):
+        distance = generator.random() * 40
+        if distance < distances.get(link.page_url, float("inf")):
+            distances[link.page_url] = distance
+            queue.push(distance, link)
+    while len(popped) < expansions and len(queue) > 0:
+        entry = queue.pop()
+        if spilling:
+            distances.pop(entry.value.page_url, None)
+        if entry.value.page_url in expanded:
+            # a spilled copy of a link that was queued again at a lower key
+            continue
+        expanded.add(entry.value.page_url)
+        popped.append(entry.key)
+        for link in page_links(entry.value, generator, fanout, page_count):
+            distance = entry.key + generator.random() * 40 + PAGE_JUMP_DISADVANTAGE
+            if link.page_url not in expanded and distance < distances.get(link.page_url, float("inf")):
+                distances[link.page_url] = distance
+                queue.push(distance, link)
+    return popped
+
+
+def measure(name, new_queue, arguments):
+    distances = {}
+    queue = new_queue(distances)
+    start = time.perf_counter()
+    popped = run_search(queue, distances, arguments.expansions, arguments.fanout, arguments.pages, arguments.seed)
+    seconds = time.perf_counter() - start
+    queued = len(queue)
+    # memory is traced in a separate pass, since tracemalloc slows down every allocation
+    distances = {}
+    queue = new_queue(distances)
+    tracemalloc.start()
+    run_search(queue, distances, arguments.expansions, arguments.fanout, arguments.pages, arguments.seed)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("%-12s %7.2fs  %8.1f MB peak  %8d queued at the end" % (name, seconds, peak / 2 ** 20, queued))
+    return popped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the unbounded queue with a spilling one on a wide search.")
+    parser.add_argument("--expansions", type=int, default=5000)
+    parser.add_argument("--fanout", type=int, default=60, help="links added by every expanded page")
+    parser.add_argument("--pages", type=int, default=10 ** 7, help="distinct pages the links point to")
+    parser.add_argument("--max-queued", type=int, action="append", help="in-memory capacities to try")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spill-directory", default=tempfile.gettempdir())
+    arguments = parser.parse_args()
+    expected = measure("unbounded", lambda distances: PriorityQueue(), arguments)
+    for max_queued in arguments.max_queued or [10000, 1000]:
+        popped = measure("spill %d" % max_queued,
+                         lambda distances: SpillingQueue(max_queued, arguments.spill_directory, tables=(distances,)),
+                         arguments)
+        assert popped == expected, "the spilling queue popped keys in a different order"
@@ -0,0 +1,173 @@
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import page_identity
+import page_store
+from LinkedListModel import CompactText
+from WikiModel import load_parsed_page
+from distance_model import PAGE_JUMP_DISADVANTAGE
+from entity_trees import WalkableEntityTree
+from page_identity import href_page_id
+from utils import get_wiki_url, lemmatize_term
+
+# every page jump costs at least the disadvantage plus a distance of one
+MIN_JUMP_COST = PAGE_JUMP_DISADVANTAGE + 1
+# edges of pages that never mention their own term carry a 1E99 distance, far beyond float precision for sums
+UNRELIABLE_COST = 1E98
+
+
+class Heuristic:
+    # estimate(link) must never exceed the cost still needed after reaching link to reach the target; estimates
+    # that also satisfy estimate(u) <= cost(u, v) + estimate(v) keep A* exact without reopening expanded pages
+
+    def prepare(self, target_term):
+        self.target_term = target_term
+
+    def estimate(self, link):
+        return 0
+
+
+class TargetMentionHeuristic(Heuristic):
+    # a page that mentions the target or links to its page under any anchor is at least one jump away from it,
+    # any other page at least two; pages are read from the parsed page store and only fetched when fetch is set
+
+    def __init__(self, fetch=False):
+        self.fetch = fetch
+        self.target_locator = None
+
+    def prepare(self, target_term):
+        super().prepare(target_term)
+        self.target_locator = WalkableEntityTree()
+        self.target_locator.push_lemmas(lemmatize_term(target_term).split(" "))
+
+    def _load(self, link):
+        url = link.page_url
+        if self.fetch:
+            return load_parsed_page(url), True
+        store = page_store.parsed_page_store
+        if store is None:
+            return None, False
+        parsed_page = store.get(url)
+        return parsed_page, parsed_page is not None or store.offline
+
+    def estimate(self, link):
+        if link.is_target:
+            return 0
+        parsed_page, known = self._load(link)
+        if not known:
+            return MIN_JUMP_COST
+        if parsed_page is None or len(parsed_page.sentences) == 0:
+            # a page that cannot be generated is a dead end
+            return float("inf")
+        # resolved on every call, like Link.is_target, since redirects to the target are learned during the search
+        target_page_id = page_identity.page_id(get_wiki_url(self.target_term))
+        for link_text, _, link_href in parsed_page.links:
+            if href_page_id(link_href, get_wiki_url(link_text)) == target_page_id:
+                return MIN_JUMP_COST
+        text = CompactText(parsed_page.sentences)
+        for sentence_index in range(text.sentence_count):
+            for _ in self.target_locator.scan(text.sentence_lemma_ids(sentence_index)):
+                return MIN_JUMP_COST
+        return 2 * MIN_JUMP_COST
+
+
+def _shortest_costs(offsets, targets, costs, source, node_count):
+    result = [float("inf")] * node_count
+    result[source] = 0.0
+    queue = [(0.0, source)]
+    while queue:
+        cost, node = heapq.heappop(queue)
+        if cost > result[node]:
+            continue
+        for edge in range(offsets[node], offsets[node + 1]):
+            new_cost = cost + costs[edge]
+            if new_cost < result[targets[edge]]:
+                result[targets[edge]] = new_cost
+                heapq.heappush(queue, (new_cost, targets[edge]))
+    return result
+
+
+class LandmarkHeuristic(Heuristic):
+    # ALT bounds on a page-level graph whose edge costs are the cheapest over every anchor variant of the source
+    # page, so they never exceed the cost DistanceModel pays whichever anchor it reached that page by; pages the
+    # LinkGraph was not built from are not covered, so the bounds only hold within the crawled pages
+
+    def __init__(self, graph, landmarks, to_landmarks, from_landmarks):
+        self.graph = graph
+        self.landmarks = landmarks
+        self.to_landmarks = to_landmarks
+        self.from_landmarks = from_landmarks
+        self.target_index = None
+
+    @staticmethod
+    def build(graph, landmark_count=8):
+        node_count = len(graph)
+        page_offsets, page_targets, page_weights = graph.page_edges()
+        costs = (page_weights + PAGE_JUMP_DISADVANTAGE).tolist()
+        in_degrees = numpy.bincount(page_targets, minlength=node_count)
+        landmarks = [int(index) for index in numpy.argsort(-in_degrees, kind="stable")[:landmark_count]]
+        sources = numpy.repeat(numpy.arange(node_count, dtype=numpy.int32), numpy.diff(page_offsets))
+        order = numpy.argsort(page_targets, kind="stable")
+        reverse_offsets = numpy.zeros(node_count + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(page_targets, minlength=node_count), out=reverse_offsets[1:])
+        reverse_targets = sources[order].tolist()
+        reverse_costs = [costs[edge] for edge in order.tolist()]
+        offsets = page_offsets.tolist()
+        targets = page_targets.tolist()
+        from_landmarks = numpy.array([_shortest_costs(offsets, targets, costs, landmark, node_count) for landmark in
+                                      landmarks], dtype=numpy.float64)
+        to_landmarks = numpy.array([_shortest_costs(reverse_offsets.tolist(), reverse_targets, reverse_costs,
+                                                    landmark, node_count) for landmark in landmarks],
+                                   dtype=numpy.float64)
+        return LandmarkHeuristic(graph, landmarks, to_landmarks, from_landmarks)
+
+    def save(self, path):
+        numpy.savez(path, landmarks=numpy.array(self.landmarks, dtype=numpy.int32), to_landmarks=self.to_landmarks,
+                    from_landmarks=self.from_landmarks)
+
+    @staticmethod
+    def load(graph, path):
+        with numpy.load(path) as arrays:
+            return LandmarkHeuristic(graph, arrays["landmarks"].tolist(), arrays["to_landmarks"],
+                                     arrays["from_landmarks"])
+
+    def prepare(self, target_term):
+        super().prepare(target_term)
+        self.target_index = self.graph.index_of(target_term)
+
+    def estimate(self, link):
+        if link.is_target:
+            return 0
+        node = self.graph.node_of(link.page_url)
+        target = self.target_index
+        if node is None or target is None:
+            return 0
+        best = 0
+        for landmark in range(len(self.landmarks)):
+            landmark_to_target = self.from_landmarks[landmark, target]
+            landmark_to_node = self.from_landmarks[landmark, node]
+            if landmark_to_target < UNRELIABLE_COST and landmark_to_node < UNRELIABLE_COST:
+                best = max(best, landmark_to_target - landmark_to_node)
+            node_to_landmark = self.to_landmarks[landmark, node]
+            target_to_landmark = self.to_landmarks[landmark, target]
+            if node_to_landmark < UNRELIABLE_COST and target_to_landmark < UNRELIABLE_COST:
+                best = max(best, node_to_landmark - target_to_landmark)
+        return float(best)
+
+
+class MaxHeuristic(Heuristic):
+
+    def __init__(self, *heuristics):
+        self.heuristics = heuristics
+
+    def prepare(self, target_term):
+        super().prepare(target_term)
+        for heuristic in self.heuristics:
+            heuristic.prepare(target_term)
+
+    def estimate(self, link):
+        return max(heuristic.estimate(link) for heuristic in self.heuristics)
@@ -0,0 +1,211 @@
+import codecs
+import http.client
+import threading
+import time
+import zlib
+from urllib.parse import quote, urljoin, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/39.0.2171.95 Safari/537.36")
+ACCEPT_ENCODING = "br, gzip, deflate" if brotli is not None else "gzip, deflate"
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# characters left alone when quoting a path, so already quoted urls pass through unchanged
+PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+CHUNK_SIZE = 64 * 1024
+
+
+class FetchError(Exception):
+
+    def __init__(self, url, status, reason):
+        super().__init__("%s: %s" % (url, reason if status is None else "%d %s" % (status, reason)))
+        self.url = url
+        self.status = status
+        self.reason = reason
+
+
+class FetchResponse:
+
+    def __init__(self, url, status, text, etag=None, last_modified=None, bytes_received=0):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.bytes_received = bytes_received
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+    @property
+    def validators(self):
+        if self.etag is None and self.last_modified is None:
+            return None
+        return self.etag, self.last_modified
+
+
+class _BrotliDecompressor:
+
+    def __init__(self):
+        self.decompressor = brotli.Decompressor()
+
+    def decompress(self, data):
+        return self.decompressor.process(data)
+
+    def flush(self):
+        return b""
+
+
+def _decompressor(content_encoding):
+    content_encoding = (content_encoding or "identity").strip().lower()
+    if content_encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if content_encoding == "deflate":
+        return zlib.decompressobj()
+    if content_encoding == "br" and brotli is not None:
+        return _BrotliDecompressor()
+    return None
+
+
+def _text_decoder(response):
+    charset = response.headers.get_content_charset("utf-8")
+    try:
+        return codecs.getincrementaldecoder(charset)(errors="ignore")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+
+class HttpClient:
+    # keeps idle keep-alive connections per host, asks for compressed bodies and decodes them while reading;
+    # connection failures and RETRY_STATUSES are retried with exponential backoff, other failures raise FetchError
+
+    def __init__(self, user_agent=DEFAULT_USER_AGENT, timeout=30, retries=3, backoff=0.5, max_backoff=30,
+                 max_idle_per_host=8, max_redirects=5):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.connections_opened = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, validators=None):
+        # validators are the (etag, last modified) pair of a cached copy; a 304 response means it is still current
+        for _ in range(self.max_redirects + 1):
+            response = self._request(url, validators)
+            if response.status not in REDIRECT_STATUSES:
+                return response
+            url = response.url
+            validators = None
+        raise FetchError(url, None, "too many redirects")
+
+    def _take_connection(self, host_key):
+        with self._lock:
+            idle = self._idle.get(host_key)
+            if idle:
+                return idle.pop(), True
+        scheme, netloc = host_key
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        self.connections_opened += 1
+        return connection_class(netloc, timeout=self.timeout), False
+
+    def _release_connection(self, host_key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(host_key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _headers(self, validators):
+        headers = {"User-Agent": self.user_agent, "Accept-Encoding": ACCEPT_ENCODING, "Connection": "keep-alive"}
+        if validators is not None:
+            etag, last_modified = validators
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def _delay(self, attempt, retry_after):
+        if retry_after is not None:
+            try:
+                return min(self.max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return min(self.max_backoff, self.backoff * 2 ** attempt)
+
+    def _request(self, url, validators):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise FetchError(url, None, "unsupported scheme %r" % parts.scheme)
+        host_key = (parts.scheme, parts.netloc)
+        path = quote(parts.path or "/", safe=PATH_SAFE) + ("?" + parts.query if parts.query else "")
+        headers = self._headers(validators)
+        attempt = 0
+        while True:
+            connection, reused = self._take_connection(host_key)
+            retry_after = None
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                result = self._read(url, response)
+            except (OSError, http.client.HTTPException) as error:
+                connection.close()
+                if reused:
+                    # the server may close an idle keep-alive connection at any time; that is not a failed attempt
+                    continue
+                failure = FetchError(url, None, str(error) or type(error).__name__)
+            else:
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._release_connection(host_key, connection)
+                if response.status in REDIRECT_STATUSES and response.getheader("Location"):
+                    result.url = urljoin(url, response.getheader("Location"))
+                    return result
+                if response.status < 400:
+                    return result
+                failure = FetchError(url, response.status, response.reason)
+                if response.status not in RETRY_STATUSES:
+                    raise failure
+                retry_after = response.getheader("Retry-After")
+            if attempt >= self.retries:
+                raise failure
+            time.sleep(self._delay(attempt, retry_after))
+            attempt += 1
+
+    @staticmethod
+    def _read(url, response):
+        decompressor = _decompressor(response.getheader("Content-Encoding"))
+        decoder = _text_decoder(response)
+        pieces = []
+        received = 0
+        try:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                received += len(chunk)
+                pieces.append(decoder.decode(chunk if decompressor is None else decompressor.decompress(chunk)))
+            pieces.append(decoder.decode(b"" if decompressor is None else decompressor.flush(), final=True))
+        except zlib.error as error:
+            raise http.client.HTTPException("undecodable body: %s" % error)
+        return FetchResponse(url, response.status, "".join(pieces), response.getheader("ETag"),
+                             response.getheader("Last-Modified"), received)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,175 @@
+import argparse
+import bz2
+import re
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from urllib.parse import quote
+
+import instrumentation
+from page_cache import LocalPageSource
+from page_identity import NON_ARTICLE_NAMESPACES
+from page_store import ParsedPageStore
+from utils import get_wiki_url
+
+comment_pattern = re.compile("<!--.*?-->", re.DOTALL)
+reference_pattern = re.compile("<ref[^>]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+template_pattern = re.compile("\\{\\{[^{}]*\\}\\}")
+table_pattern = re.compile("\\{\\|.*?\\|\\}", re.DOTALL)
+internal_link_pattern = re.compile("\\[\\[([^\\[\\]|]*)(?:\\|([^\\[\\]]*))?\\]\\]")
+external_link_pattern = re.compile("\\[(?:https?:)?//[^\\s\\]]+ *([^\\]]*)\\]")
+emphasis_pattern = re.compile("'{2,}")
+heading_pattern = re.compile("^(=+)\\s*(.*?)\\s*\\1\\s*$")
+list_pattern = re.compile("^[*#:;]+\\s*")
+interwiki_prefix_pattern = re.compile("^[a-z][a-z-]*$")
+
+_worker_store = None
+
+
+def _remove_nested(pattern, text):
+    previous = None
+    while previous != text:
+        previous = text
+        text = pattern.sub("", text)
+    return text
+
+
+def _replace_link(match):
+    target, label = match.group(1).strip(), match.group(2)
+    namespace, separator, _ = target.lstrip(":").partition(":")
+    namespace = namespace.strip()
+    if separator and (namespace[:1].upper() + namespace[1:] in NON_ARTICLE_NAMESPACES or namespace.endswith(" talk")):
+        # files and categories are not part of the article text, unless a leading colon makes them a plain link
+        return (label or "") if target.startswith(":") else ""
+    if separator and interwiki_prefix_pattern.match(namespace):
+        # other languages and projects: the label is still text, but there is no article here to link to
+        return label or ""
+    text = target if label is None else label
+    href = "/wiki/" + quote(target.split("#", 1)[0].replace(" ", "_"))
+    return '<a href="%s">%s</a>' % (href, text)
+
+
+def wikitext_to_html(wikitext):
+    text = reference_pattern.sub("", comment_pattern.sub("", wikitext))
+    text = table_pattern.sub("", _remove_nested(template_pattern, text))
+    previous = None
+    while previous != text:
+        previous = text
+        text = internal_link_pattern.sub(_replace_link, text)
+    text = emphasis_pattern.sub("", external_link_pattern.sub("\\1", text))
+    blocks = []
+    paragraph = []
+    for line in text.split("\n"):
+        heading = heading_pattern.match(line)
+        if heading is not None or list_pattern.match(line) or not line.strip():
+            if paragraph:
+                blocks.append("<p>%s</p>" % " ".join(paragraph))
+                paragraph = []
+            if heading is not None:
+                blocks.append("<h2>%s</h2>" % heading.group(2))
+            elif line.strip():
+                blocks.append("<li>%s</li>" % list_pattern.sub("", line))
+        else:
+            paragraph.append(line.strip())
+    if paragraph:
+        blocks.append("<p>%s</p>" % " ".join(paragraph))
+    return "<html><body>\n%s\n</body></html>" % "\n".join(blocks)
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def dump_pages(path):
+    # yields (title, redirect title, wikitext) for every article; the root is cleared after each page, since
+    # clearing only the page would still leave an empty element per page under it
+    opener = bz2.open if path.endswith(".bz2") else open
+    with opener(path, "rb") as dump_file:
+        root = None
+        title = redirect = text = None
+        namespace = "0"
+        for event, element in ElementTree.iterparse(dump_file, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+            name = _local_name(element.tag)
+            if name == "title":
+                title = element.text
+            elif name == "ns":
+                namespace = element.text
+            elif name == "redirect":
+                redirect = element.get("title")
+            elif name == "text":
+                text = element.text or ""
+            elif name == "page":
+                if namespace == "0" and title is not None:
+                    yield title, redirect, text or ""
+                title = redirect = text = None
+                namespace = "0"
+                root.clear()
+
+
+def _start_worker(directory):
+    global _worker_store
+    _worker_store = ParsedPageStore(directory)
+
+
+def _ingest_page(url, content, is_wikitext):
+    from WikiModel import parse_page
+    htext = wikitext_to_html(content) if is_wikitext else content
+    _worker_store.put(url, parse_page(htext))
+    return url
+
+
+def ingest(store, items, workers=4, max_pending=None):
+    # items yields (url, redirect url, content, is_wikitext); pages already stored with the current extraction
+    # version are skipped, so an interrupted run can simply be started again
+    max_pending = workers * 4 if max_pending is None else max_pending
+    ingested = skipped = redirects = 0
+    with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(store.directory,)) as executor:
+        pending = set()
+        for url, redirect_url, content, is_wikitext in items:
+            if redirect_url is not None:
+                store.alias(url, redirect_url)
+                redirects += 1
+                instrumentation.current.count("redirects_recorded")
+                continue
+            if store.is_current(url):
+                skipped += 1
+                instrumentation.current.count("pages_skipped")
+                continue
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    ingested += 1
+                    instrumentation.current.count("pages_ingested")
+            pending.add(executor.submit(_ingest_page, url, content, is_wikitext))
+        for future in pending:
+            future.result()
+            ingested += 1
+            instrumentation.current.count("pages_ingested")
+    return ingested, skipped, redirects
+
+
+def dump_items(path):
+    for title, redirect, text in dump_pages(path):
+        yield get_wiki_url(title), None if redirect is None else get_wiki_url(redirect), text, True
+
+
+def html_items(directory):
+    for url, htext in LocalPageSource(directory).pages():
+        yield url, None, htext, False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a local parsed page store from a dump or saved pages.")
+    parser.add_argument("store", help="directory of the parsed page store")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dump", help="MediaWiki XML dump, optionally bz2 compressed")
+    source.add_argument("--html", help="directory of saved <Title>.html pages")
+    parser.add_argument("--workers", type=int, default=4)
+    arguments = parser.parse_args()
+    page_items = dump_items(arguments.dump) if arguments.dump else html_items(arguments.html)
+    counts = ingest(ParsedPageStore(arguments.store), page_items, arguments.workers)
+    print("Ingested %d pages, skipped %d already stored, recorded %d redirects" % counts)
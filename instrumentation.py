@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class _DisabledTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_disabled_timer = _DisabledTimer()
+
+
+class DisabledInstrumentation:
+    # the default; every call returns immediately so instrumented code pays one attribute lookup and call
+    enabled = False
+
+    def timer(self, name, **fields):
+        return _disabled_timer
+
+    def count(self, name, amount=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def event(self, name, **fields):
+        pass
+
+    def summary(self):
+        return {"counters": {}, "gauges": {}, "timers": {}}
+
+    def close(self):
+        pass
+
+
+class _Timer:
+    __slots__ = ["instrumentation", "name", "fields", "start"]
+
+    def __init__(self, instrumentation, name, fields):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.fields = fields
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.record_span(self.name, self.start, time.perf_counter() - self.start, self.fields)
+        return False
+
+
+class Instrumentation:
+    enabled = True
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name, **fields):
+        return _Timer(self, name, fields)
+
+    def record_span(self, name, start, duration, fields):
+        with self._lock:
+            total = self.timers.get(name)
+            if total is None:
+                total = self.timers[name] = [0, 0.0]
+            total[0] += 1
+            total[1] += duration
+        for sink in self.sinks:
+            sink.span(name, start, duration, fields)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            value = self.counters[name] = self.counters.get(name, 0) + amount
+        for sink in self.sinks:
+            sink.counter(name, time.perf_counter(), value)
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+        for sink in self.sinks:
+            sink.counter(name, time.perf_counter(), value)
+
+    def event(self, name, **fields):
+        for sink in self.sinks:
+            sink.event(name, time.perf_counter(), fields)
+
+    def summary(self):
+        with self._lock:
+            return {"counters": dict(self.counters), "gauges": dict(self.gauges),
+                    "timers": {name: {"count": count, "seconds": seconds} for name, (count, seconds) in
+                               self.timers.items()}}
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def _format_fields(fields):
+    return " ".join("%s=%s" % item for item in fields.items())
+
+
+class LoggingSink:
+    # events are logged at info, like the prints they replace; spans and counters only at debug
+
+    def __init__(self, logger=None):
+        self.logger = logging.getLogger("relationfinder") if logger is None else logger
+
+    def span(self, name, start, duration, fields):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s took %.3f ms %s", name, duration * 1000, _format_fields(fields))
+
+    def counter(self, name, timestamp, value):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s = %s", name, value)
+
+    def event(self, name, timestamp, fields):
+        self.logger.info("%s %s", name, _format_fields(fields))
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+
+    def __init__(self, path):
+        self.output = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self.output.write(line)
+
+    def span(self, name, start, duration, fields):
+        self._write({"type": "span", "name": name, "start": start, "duration": duration, "fields": fields})
+
+    def counter(self, name, timestamp, value):
+        self._write({"type": "counter", "name": name, "time": timestamp, "value": value})
+
+    def event(self, name, timestamp, fields):
+        self._write({"type": "event", "name": name, "time": timestamp, "fields": fields})
+
+    def close(self):
+        with self._lock:
+            self.output.close()
+
+
+class ChromeTraceSink:
+    # written on close in the trace event format read by chrome://tracing and Perfetto
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self.process_id = os.getpid()
+        self._lock = threading.Lock()
+
+    def _append(self, trace_event):
+        trace_event["pid"] = self.process_id
+        trace_event["tid"] = threading.get_ident()
+        with self._lock:
+            self.events.append(trace_event)
+
+    def span(self, name, start, duration, fields):
+        self._append({"name": name, "ph": "X", "ts": start * 1E6, "dur": duration * 1E6, "args": fields})
+
+    def counter(self, name, timestamp, value):
+        self._append({"name": name, "ph": "C", "ts": timestamp * 1E6, "args": {name: value}})
+
+    def event(self, name, timestamp, fields):
+        self._append({"name": name, "ph": "i", "s": "t", "ts": timestamp * 1E6, "args": fields})
+
+    def close(self):
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as trace_file:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, trace_file, default=str)
+
+
+current = DisabledInstrumentation()
+
+
+def set_instrumentation(new_instrumentation):
+    global current
+    current = new_instrumentation
@@ -0,0 +1,57 @@
+import threading
+
+from tokenizer import MorphyTable
+
+
+class Lemmatizer:
+    # lemmas come from a MorphyTable when one is given and from TextBlob's Word.lemmatize otherwise
+
+    def __init__(self, max_cached=200000, morphy=None):
+        self.max_cached = max_cached
+        self.morphy = morphy
+        self.lemmas = []
+        self.hits = 0
+        self.misses = 0
+        self._lemma_to_id = {}
+        self._surface_to_id = {}
+        self._lock = threading.Lock()
+
+    def intern(self, lemma):
+        lemma_id = self._lemma_to_id.get(lemma)
+        if lemma_id is not None:
+            return lemma_id
+        with self._lock:
+            lemma_id = self._lemma_to_id.get(lemma)
+            if lemma_id is None:
+                lemma_id = len(self.lemmas)
+                self.lemmas.append(lemma)
+                self._lemma_to_id[lemma] = lemma_id
+            return lemma_id
+
+    def lemma_id(self, surface):
+        lemma_id = self._surface_to_id.get(surface)
+        if lemma_id is not None:
+            self.hits += 1
+            return lemma_id
+        self.misses += 1
+        surface = str(surface)
+        if self.morphy is not None:
+            lemma = self.morphy.lemmatize(surface)
+        else:
+            from textblob import Word
+            lemma = Word(surface).lemmatize()
+        lemma_id = self.intern(lemma.lower())
+        with self._lock:
+            if len(self._surface_to_id) >= self.max_cached:
+                del self._surface_to_id[next(iter(self._surface_to_id))]
+            self._surface_to_id[surface] = lemma_id
+        return lemma_id
+
+    def lemmatize(self, surface):
+        return self.lemmas[self.lemma_id(surface)]
+
+    def lemma(self, lemma_id):
+        return self.lemmas[lemma_id]
+
+
+default_lemmatizer = Lemmatizer(morphy=MorphyTable.load())
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from textblob import TextBlob
+
+from lemmatizer import Lemmatizer
+from text_extraction import get_text
+
+
+def load_corpus_words(directory):
+    words = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".html"):
+            continue
+        with open(os.path.join(directory, file_name), encoding="utf-8", errors="ignore") as page_file:
+            soup = BeautifulSoup(page_file.read(), "html.parser")
+        words.extend(TextBlob(get_text(soup)).words)
+    return words
+
+
+def lemmatize_directly(words):
+    return [word.lemmatize().lower() for word in words]
+
+
+def lemmatize_memoized(words):
+    lemmatizer = Lemmatizer()
+    return [lemmatizer.lemmatize(word) for word in words]
+
+
+def time_run(run, words):
+    start = time.perf_counter()
+    result = run(words)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    corpus_words = load_corpus_words(sys.argv[1])
+    direct_time, direct_result = time_run(lemmatize_directly, corpus_words)
+    memoized_time, memoized_result = time_run(lemmatize_memoized, corpus_words)
+    assert direct_result == memoized_result
+    print("%d words, %d distinct" % (len(corpus_words), len(set(corpus_words))))
+    print("Word.lemmatize: %.0f words/s" % (len(corpus_words) / direct_time))
+    print("Lemmatizer:     %.0f words/s (%.1fx)" % (len(corpus_words) / memoized_time, direct_time / memoized_time))
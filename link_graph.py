@@ -0,0 +1,364 @@
+import argparse
+import heapq
+import json
+import os
+import time
+from collections import deque
+from urllib.parse import unquote
+
+import numpy
+
+import page_identity
+import page_store
+from LinkedListModel import CompactText
+from WikiModel import locate_text
+from data_extraction import PageDistances, TextLocator
+from distance_model import PAGE_JUMP_DISADVANTAGE
+from entity_trees import WalkableEntityTree
+from lemmatizer import default_lemmatizer
+from page_identity import href_page_id
+from page_store import page_key
+from utils import get_wiki_url, lemmatize_term
+
+ARRAY_NAMES = ["variant_offsets", "offsets", "targets", "target_variants", "weights", "linked", "center_sentences",
+               "word_sentences"]
+
+
+class GraphTerm:
+    __slots__ = ["index", "link_id", "anchor"]
+
+    def __init__(self, index, link_id, anchor=None):
+        self.index = index
+        self.link_id = link_id
+        self.anchor = anchor
+
+
+def page_title(url):
+    return url.split("/wiki/", 1)[1]
+
+
+def title_text(url):
+    return unquote(page_title(url)).replace("_", " ")
+
+
+class LinkGraph:
+
+    def __init__(self, urls, terms, aliases, anchors, variant_offsets, offsets, targets, target_variants, weights,
+                 linked, center_sentences, word_sentences):
+        # nodes are canonical page urls, like Link.page_url; terms are the lemmatized titles that text mentions of a
+        # page are matched by, and aliases map every other url a page was linked by to its node. DistanceModel
+        # weighs a page from the anchor text it was reached by, so every node has a variant per lemmatized anchor it
+        # is linked by, and for its title and seed term, in anchors between its variant_offsets; the edges of a
+        # variant lie between its offsets, and a linked edge leads to the variant of its own anchor
+        self.urls = urls
+        self.terms = terms
+        self.aliases = aliases
+        self.anchors = anchors
+        self.url_to_index = dict(aliases)
+        self.url_to_index.update((url, index) for index, url in enumerate(urls))
+        self.variant_offsets = variant_offsets
+        self.offsets = offsets
+        self.targets = targets
+        self.target_variants = target_variants
+        self.weights = weights
+        self.linked = linked
+        self.center_sentences = center_sentences
+        self.word_sentences = word_sentences
+
+    def __len__(self):
+        return len(self.urls)
+
+    def index_of(self, term):
+        return self.node_of(get_wiki_url(term))
+
+    def node_of(self, url):
+        return self.url_to_index.get(page_identity.page_id(url))
+
+    def variant_of(self, node, term):
+        lemmatized = lemmatize_term(term)
+        for variant in range(int(self.variant_offsets[node]), int(self.variant_offsets[node + 1])):
+            if self.anchors[variant] == lemmatized:
+                return variant
+        return None
+
+    def locator(self, edge):
+        page_id = self.urls[self.edge_source(edge)]
+        if self.center_sentences[edge] < 0:
+            return TextLocator(page_id, None, None)
+        return TextLocator(page_id, int(self.center_sentences[edge]), int(self.word_sentences[edge]))
+
+    def edge_source(self, edge):
+        variant = int(numpy.searchsorted(self.offsets, edge, side="right")) - 1
+        return int(numpy.searchsorted(self.variant_offsets, variant, side="right")) - 1
+
+    def page_edges(self):
+        # (offsets, targets, weights) of one edge per linked pair of pages, weighing the cheapest of its variants:
+        # a lower bound on the edge whatever anchor the page was reached by
+        node_count = len(self.urls)
+        variant_nodes = numpy.repeat(numpy.arange(node_count, dtype=numpy.int64), numpy.diff(self.variant_offsets))
+        sources = numpy.repeat(variant_nodes, numpy.diff(self.offsets))
+        pairs = sources * node_count + numpy.asarray(self.targets, dtype=numpy.int64)
+        order = numpy.lexsort((self.weights, pairs))
+        first = numpy.ones(len(order), dtype=bool)
+        first[1:] = pairs[order][1:] != pairs[order][:-1]
+        cheapest = order[first]
+        offsets = numpy.zeros(node_count + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(sources[cheapest], minlength=node_count), out=offsets[1:])
+        return offsets, numpy.asarray(self.targets)[cheapest], numpy.asarray(self.weights)[cheapest]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            numpy.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+        with open(os.path.join(directory, "nodes.json"), "w", encoding="utf-8") as nodes_file:
+            json.dump({"urls": self.urls, "terms": self.terms, "aliases": self.aliases, "anchors": self.anchors},
+                      nodes_file)
+
+    @staticmethod
+    def load(directory):
+        with open(os.path.join(directory, "nodes.json"), encoding="utf-8") as nodes_file:
+            nodes = json.load(nodes_file)
+        arrays = [numpy.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in ARRAY_NAMES]
+        return LinkGraph(nodes["urls"], nodes["terms"], nodes["aliases"], nodes["anchors"], *arrays)
+
+
+def _crawl(store, seed_terms, max_pages):
+    # breadth first over hrefs, as the online search follows them; every url a page is linked by is resolved through
+    # the store's aliases to the url the page is kept under, so each page is one node
+    urls = []
+    terms = []
+    url_to_index = {}
+    aliases = {}
+    page_links = {}
+    # node -> {anchor lemma: anchor text} of every anchor the node is linked by, its title and its seed term
+    anchors = []
+
+    def add(url, term=None):
+        linked_url = page_identity.page_id(url)
+        index = url_to_index.get(linked_url)
+        if index is None:
+            page_url = page_key(store.resolve(linked_url))
+            index = url_to_index.get(page_url)
+            if index is None:
+                index = url_to_index[page_url] = len(urls)
+                urls.append(page_url)
+                terms.append(lemmatize_term(title_text(page_url) if term is None else term))
+                anchors.append({lemmatize_term(title_text(page_url)): title_text(page_url)})
+                pending.append(index)
+            if linked_url != page_url:
+                url_to_index[linked_url] = aliases[linked_url] = index
+        if term is not None:
+            anchors[index].setdefault(lemmatize_term(term), term)
+        return index
+
+    pending = deque()
+    for seed_term in seed_terms:
+        add(get_wiki_url(seed_term), seed_term)
+    while pending and (max_pages is None or len(page_links) < max_pages):
+        index = pending.popleft()
+        parsed_page = store.get(urls[index])
+        if parsed_page is None or len(parsed_page.sentences) == 0:
+            continue
+        # anchor lemma -> linked node, the last link with an anchor winning as in WikiPage.extract_links
+        links = {}
+        for link_text, lemmatized, link_href in parsed_page.links:
+            target = add(href_page_id(link_href, get_wiki_url(link_text)))
+            anchors[target].setdefault(lemmatized, link_text)
+            links[lemmatized] = target
+        page_links[index] = links
+    return urls, terms, aliases, anchors, page_links, add
+
+
+def _nearest(distances, term_locator):
+    # node -> (distance, locator, anchor lemma) of its nearest mention; the first of equally near ones wins, as a
+    # link only decreases a queued page's distance in DistanceModel when it is strictly shorter
+    best = {}
+    for graph_term, distance, locator in distances.read_nearest(term_locator):
+        if graph_term.index not in best or distance < best[graph_term.index][0]:
+            best[graph_term.index] = (distance, locator, graph_term.anchor)
+    return best
+
+
+def build_graph(store, seed_terms, extra_terms=(), max_pages=None):
+    # every link becomes an edge weighted like PageDistances.read_nearest over its anchor text, and every mention of
+    # a page's title an edge flagged unlinked, which queries only follow into the target, like the synthetic target
+    # link of WikiPage. each page is weighed once per anchor it is linked by, as the online search weighs it from
+    # the anchor it followed, so a page costs a pass over its text for every distinct anchor
+    urls, terms, aliases, anchors, page_links, add = _crawl(store, seed_terms, max_pages)
+    for extra_term in extra_terms:
+        add(get_wiki_url(extra_term), extra_term)
+    term_locator = WalkableEntityTree()
+    for index, term in enumerate(terms):
+        term_locator.push_lemmas(term.split(" "), associated_data=GraphTerm(index, default_lemmatizer.intern(term)))
+    variant_offsets = [0]
+    variant_index = {}
+    anchor_lemmas = []
+    for index, node_anchors in enumerate(anchors):
+        for lemmatized in node_anchors:
+            variant_index[index, lemmatized] = len(anchor_lemmas)
+            anchor_lemmas.append(lemmatized)
+        variant_offsets.append(len(anchor_lemmas))
+    offsets = [0]
+    targets = []
+    target_variants = []
+    weights = []
+    linked = []
+    center_sentences = []
+    word_sentences = []
+
+    def add_edge(target, distance, locator, anchor):
+        targets.append(target)
+        target_variants.append(-1 if anchor is None else variant_index[target, anchor])
+        weights.append(distance)
+        linked.append(anchor is not None)
+        center_sentences.append(-1 if locator.center_sentence is None else locator.center_sentence)
+        word_sentences.append(-1 if locator.word_sentence is None else locator.word_sentence)
+
+    for index, url in enumerate(urls):
+        text = None
+        if index in page_links:
+            text = CompactText(store.get(url).sentences)
+            link_locator = WalkableEntityTree()
+            for lemmatized, target in page_links[index].items():
+                link_locator.push_lemmas(lemmatized.split(" "), associated_data=GraphTerm(
+                    target, default_lemmatizer.intern(lemmatized), lemmatized))
+        for anchor_text in anchors[index].values():
+            if text is not None:
+                distances = PageDistances(text, anchor_text, url)
+                links = _nearest(distances, link_locator)
+                for target, (distance, locator, anchor) in links.items():
+                    add_edge(target, distance, locator, anchor)
+                for target, (distance, locator, _) in _nearest(distances, term_locator).items():
+                    if target not in links or distance < links[target][0]:
+                        add_edge(target, distance, locator, None)
+            offsets.append(len(targets))
+    return LinkGraph(urls, terms, aliases, anchor_lemmas, numpy.array(variant_offsets, dtype=numpy.int32),
+                     numpy.array(offsets, dtype=numpy.int64), numpy.array(targets, dtype=numpy.int32),
+                     numpy.array(target_variants, dtype=numpy.int32), numpy.array(weights, dtype=numpy.float64),
+                     numpy.array(linked, dtype=numpy.bool_), numpy.array(center_sentences, dtype=numpy.int32),
+                     numpy.array(word_sentences, dtype=numpy.int32))
+
+
+class GraphPath:
+
+    def __init__(self, graph, cost, nodes, edges):
+        self.graph = graph
+        self.cost = cost
+        self.nodes = nodes
+        self.edges = edges
+
+    def locators(self):
+        return [self.graph.locator(edge) for edge in self.edges]
+
+    def get_linked_text(self):
+        # same order as Link.get_linked_text: the target's sentence first, back to the start page
+        return " ".join(locate_text(locator) for locator in reversed(self.locators()))
+
+    def __repr__(self):
+        return " -> ".join(self.graph.terms[node] for node in self.nodes) + " (%g)" % self.cost
+
+
+class GraphSearch:
+    # Dijkstra over pages like DistanceModel: a page is expanded from the variant of the anchor of the edge that
+    # reached it at its lowest cost, and the start page from the variant of the start term, which has to be its
+    # title, a seed term or an anchor it is linked by
+
+    def __init__(self, graph):
+        self.graph = graph
+        # plain lists are much faster than numpy scalars for the element-wise access of the search loop
+        self.offsets = graph.offsets.tolist()
+        self.targets = graph.targets.tolist()
+        self.target_variants = graph.target_variants.tolist()
+        self.weights = graph.weights.tolist()
+        self.linked = graph.linked.tolist()
+
+    def search(self, start_term, target_term):
+        start = self.graph.index_of(start_term)
+        target = self.graph.index_of(target_term)
+        if start is None or target is None:
+            return None
+        start_variant = self.graph.variant_of(start, start_term)
+        if start_variant is None:
+            return None
+        offsets, targets, target_variants, weights, linked = (self.offsets, self.targets, self.target_variants,
+                                                              self.weights, self.linked)
+        costs = {}
+        via = {}
+        queue = []
+        counter = 0
+        for edge in range(offsets[start_variant], offsets[start_variant + 1]):
+            node = targets[edge]
+            if node == start or not (linked[edge] or node == target):
+                continue
+            if node not in costs or weights[edge] < costs[node]:
+                costs[node] = weights[edge]
+                via[node] = edge
+                heapq.heappush(queue, (weights[edge], counter, node))
+                counter += 1
+        expanded = {start}
+        while queue:
+            cost, _, node = heapq.heappop(queue)
+            if node in expanded:
+                continue
+            expanded.add(node)
+            if node == target:
+                return self._path(start, target, cost, via)
+            variant = target_variants[via[node]]
+            for edge in range(offsets[variant], offsets[variant + 1]):
+                next_node = targets[edge]
+                if next_node in expanded or not (linked[edge] or next_node == target):
+                    continue
+                new_cost = cost + weights[edge] + PAGE_JUMP_DISADVANTAGE
+                if next_node not in costs or new_cost < costs[next_node]:
+                    costs[next_node] = new_cost
+                    via[next_node] = edge
+                    heapq.heappush(queue, (new_cost, counter, next_node))
+                    counter += 1
+        return None
+
+    def _path(self, start, target, cost, via):
+        nodes = [target]
+        edges = []
+        while nodes[-1] != start:
+            edge = via[nodes[-1]]
+            edges.append(edge)
+            nodes.append(self.graph.edge_source(edge))
+        nodes.reverse()
+        edges.reverse()
+        return GraphPath(self.graph, cost, nodes, edges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query a precomputed link graph.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build")
+    build_parser.add_argument("store", help="parsed page store directory")
+    build_parser.add_argument("graph", help="output directory")
+    build_parser.add_argument("--seed", action="append", required=True, help="term to start crawling the store from")
+    build_parser.add_argument("--target", action="append", default=[], help="term that may be queried as a target")
+    build_parser.add_argument("--max-pages", type=int)
+    build_parser.add_argument("--landmarks", type=int, default=0, help="hub pages to precompute A* bounds for")
+    query_parser = commands.add_parser("query")
+    query_parser.add_argument("graph")
+    query_parser.add_argument("start")
+    query_parser.add_argument("target")
+    query_parser.add_argument("--store", help="parsed page store used to print the explanation text")
+    arguments = parser.parse_args()
+    if arguments.command == "build":
+        link_graph = build_graph(page_store.ParsedPageStore(arguments.store, offline=True),
+                                 arguments.seed, arguments.target, arguments.max_pages)
+        link_graph.save(arguments.graph)
+        print("Saved %d terms and %d edges" % (len(link_graph), len(link_graph.targets)))
+        if arguments.landmarks > 0:
+            from heuristics import LandmarkHeuristic
+            LandmarkHeuristic.build(link_graph, arguments.landmarks).save(os.path.join(arguments.graph,
+                                                                                        "landmarks.npz"))
+    else:
+        graph_search = GraphSearch(LinkGraph.load(arguments.graph))
+        query_start = time.perf_counter()
+        path = graph_search.search(arguments.start, arguments.target)
+        print("Searched in %.3f ms" % ((time.perf_counter() - query_start) * 1000))
+        print(path)
+        if path is not None and arguments.store is not None:
+            page_store.set_parsed_page_store(page_store.ParsedPageStore(arguments.store, offline=True))
+            print(path.get_linked_text())
@@ -0,0 +1,241 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import unquote
+
+import instrumentation
+
+
+class PageCache:
+
+    def __init__(self, path=None, max_entries=512, max_bytes=64 * 1024 * 1024, max_disk_bytes=None, ttl=None,
+                 fetcher=None, offline=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.fetcher = fetcher
+        self.offline = offline
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.revalidated = 0
+        self.stale_served = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        # expired pages that carry validators, kept until the next get of their url can revalidate them
+        self._stale = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, url TEXT, body BLOB, "
+                             "size INTEGER, fetched_at REAL, accessed_at REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS validators (key TEXT PRIMARY KEY, etag TEXT, "
+                             "last_modified TEXT)")
+            self._db.commit()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _is_fresh(self, fetched_at):
+        if self.ttl is None or time.time() - fetched_at < self.ttl:
+            return True
+        if self.offline:
+            # nothing could replace an expired page, so an offline cache serves it however old it is
+            self.stale_served += 1
+            instrumentation.current.count("page_cache_stale_served")
+            return True
+        return False
+
+    def _get_memory(self, key):
+        if key not in self._memory:
+            return None
+        html, fetched_at, validators = self._memory[key]
+        if not self._is_fresh(fetched_at):
+            self._drop_memory(key)
+            self._expire(key, html, validators)
+            return None
+        self._memory.move_to_end(key)
+        return html
+
+    def _expire(self, key, html, validators):
+        self.expired += 1
+        if validators is not None:
+            self._stale[key] = (html, validators)
+            while len(self._stale) > self.max_entries:
+                self._stale.popitem(last=False)
+
+    def _put_memory(self, key, html, fetched_at, validators=None):
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (html, fetched_at, validators)
+        self._memory_bytes += len(html)
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            self._drop_memory(next(iter(self._memory)))
+            self.evictions += 1
+
+    def _drop_memory(self, key):
+        html = self._memory.pop(key)[0]
+        self._memory_bytes -= len(html)
+
+    def _get_disk(self, key):
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT body, fetched_at, etag, last_modified FROM pages LEFT JOIN validators "
+                               "USING (key) WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        body, fetched_at, etag, last_modified = row
+        validators = None if etag is None and last_modified is None else (etag, last_modified)
+        if not self._is_fresh(fetched_at):
+            self._delete_disk(key)
+            self._db.commit()
+            self._expire(key, None if validators is None else zlib.decompress(body).decode("utf-8"), validators)
+            return None
+        self._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return zlib.decompress(body).decode("utf-8"), fetched_at, validators
+
+    def _delete_disk(self, key):
+        self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+        self._db.execute("DELETE FROM validators WHERE key = ?", (key,))
+
+    def _put_disk(self, key, url, html, fetched_at, validators=None):
+        if self._db is None:
+            return
+        body = zlib.compress(html.encode("utf-8"))
+        self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, url, body, len(body), fetched_at, fetched_at))
+        if validators is None:
+            self._db.execute("DELETE FROM validators WHERE key = ?", (key,))
+        else:
+            self._db.execute("INSERT OR REPLACE INTO validators VALUES (?, ?, ?)", (key,) + tuple(validators))
+        if self.max_disk_bytes is not None:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            while total > self.max_disk_bytes:
+                oldest = self._db.execute("SELECT key, size FROM pages WHERE key != ? ORDER BY accessed_at LIMIT 1",
+                                          (key,)).fetchone()
+                if oldest is None:
+                    break
+                self._delete_disk(oldest[0])
+                total -= oldest[1]
+                self.evictions += 1
+        self._db.commit()
+
+    def lookup(self, url):
+        key = PageCache.key(url)
+        with self._lock:
+            html = self._get_memory(key)
+            if html is not None:
+                self.hits += 1
+                instrumentation.current.count("page_cache_hits")
+                return html
+            disk_result = self._get_disk(key)
+            if disk_result is not None:
+                self.disk_hits += 1
+                instrumentation.current.count("page_cache_disk_hits")
+                html, fetched_at, validators = disk_result
+                self._put_memory(key, html, fetched_at, validators)
+                return html
+            self.misses += 1
+            instrumentation.current.count("page_cache_misses")
+            return None
+
+    def put(self, url, html, validators=None):
+        key = PageCache.key(url)
+        fetched_at = time.time()
+        with self._lock:
+            self._put_memory(key, html, fetched_at, validators)
+            self._put_disk(key, url, html, fetched_at, validators)
+
+    def get(self, url, fetcher=None, revalidator=None):
+        # revalidator(url, validators) returns (html, validators), with html None when the cached copy is current
+        html = self.lookup(url)
+        if html is not None:
+            return html
+        if self.fetcher is not None:
+            fetcher = self.fetcher
+            revalidator = None
+        key = PageCache.key(url)
+        with self._lock:
+            # left in place until the page is stored again, so that a failed fetch can still serve it
+            stale = self._stale.get(key)
+        if self.offline or fetcher is None:
+            return ""
+        if revalidator is None:
+            html, validators = fetcher(url), None
+        else:
+            html, validators = revalidator(url, None if stale is None else stale[1])
+            if html is None and stale is not None:
+                self.revalidated += 1
+                instrumentation.current.count("page_cache_revalidated")
+                html = stale[0]
+                validators = validators or stale[1]
+        if not html and stale is not None:
+            self.stale_served += 1
+            instrumentation.current.count("page_cache_stale_served")
+            return stale[0]
+        if html:
+            with self._lock:
+                self._stale.pop(key, None)
+            self.put(url, html, validators)
+        return html or ""
+
+    def seed(self, pages):
+        for url, html in pages:
+            self.put(url, html)
+
+    def __contains__(self, url):
+        key = PageCache.key(url)
+        with self._lock:
+            if key in self._memory:
+                return True
+            if self._db is None:
+                return False
+            return self._db.execute("SELECT 1 FROM pages WHERE key = ?", (key,)).fetchone() is not None
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "expired": self.expired,
+                "revalidated": self.revalidated, "stale_served": self.stale_served, "evictions": self.evictions,
+                "memory_entries": len(self._memory), "memory_bytes": self._memory_bytes}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class LocalPageSource:
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def file_name(title):
+        return title.replace(" ", "_").replace("/", "%2F") + ".html"
+
+    def path_for(self, url):
+        title = unquote(url.rsplit("/wiki/", 1)[-1])
+        return os.path.join(self.directory, LocalPageSource.file_name(title))
+
+    def __call__(self, url):
+        path = self.path_for(url)
+        if not os.path.exists(path):
+            return ""
+        with open(path, encoding="utf-8", errors="ignore") as page_file:
+            return page_file.read()
+
+    def pages(self, base_url="https://en.wikipedia.org/wiki/"):
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(".html"):
+                continue
+            title = unquote(file_name[:-len(".html")]).replace("_", " ")
+            yield base_url + title, self(base_url + title)
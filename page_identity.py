@@ -0,0 +1,81 @@
+import threading
+from functools import lru_cache
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from page_store import page_key
+
+WIKI_BASE_URL = "https://en.wikipedia.org/wiki/"
+NON_ARTICLE_NAMESPACES = {"Book", "Category", "Draft", "File", "Help", "Image", "Media", "MediaWiki", "Module",
+                          "Portal", "Special", "Talk", "Template", "TimedText", "User", "Wikipedia", "WP"}
+MAX_REDIRECT_HOPS = 8
+
+
+@lru_cache(maxsize=65536)
+def normalize_href(href, base_url=WIKI_BASE_URL):
+    # the page key of the article an href points at, or None when it does not point at an article;
+    # relative, protocol relative and index.php?title= forms all map to the same key, and fragments are dropped
+    if not href:
+        return None
+    parsed = urlparse(urljoin(base_url, href.strip()))
+    if "/wiki/" in parsed.path:
+        title = parsed.path.split("/wiki/", 1)[1]
+    else:
+        titles = parse_qs(parsed.query).get("title")
+        if not titles:
+            return None
+        title = titles[0]
+    url = page_key("%s://%s/wiki/%s" % (parsed.scheme, parsed.netloc, title))
+    title = url.split("/wiki/", 1)[1]
+    if not title:
+        return None
+    namespace, separator, _ = title.partition(":")
+    if separator and (namespace in NON_ARTICLE_NAMESPACES or namespace.endswith(" talk")):
+        return None
+    return url
+
+
+class PageIndex:
+    # maps the page key of every title seen for an article to the page key of the article itself; redirects are
+    # learned from canonical links and store aliases as pages are loaded
+
+    def __init__(self):
+        self.canonical = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, url):
+        key = page_key(url)
+        with self._lock:
+            for _ in range(MAX_REDIRECT_HOPS):
+                target = self.canonical.get(key)
+                if target is None:
+                    break
+                key = target
+        return key
+
+    def record(self, url, canonical_url):
+        key = page_key(url)
+        target = self.resolve(canonical_url)
+        if key != target:
+            with self._lock:
+                self.canonical[key] = target
+        return target
+
+    def __len__(self):
+        return len(self.canonical)
+
+
+page_index = PageIndex()
+
+
+def set_page_index(index):
+    global page_index
+    page_index = index
+
+
+def page_id(url):
+    return page_index.resolve(url)
+
+
+def href_page_id(href, fallback_url):
+    url = normalize_href(href)
+    return page_id(fallback_url if url is None else url)
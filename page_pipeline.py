@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import page_identity
+import page_store
+import text_extraction
+from WikiModel import parse_page
+from page_store import ParsedPage
+from text_extraction import getInp
+
+
+def parse_page_bytes(htext):
+    # runs in a worker process; the store encoding is compact and keeps lemmas as strings, since lemma ids are only
+    # meaningful inside the process that interned them
+    return parse_page(htext).to_bytes()
+
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class PagePipeline:
+    # fetch threads -> parse processes -> futures of ParsedPage for the caller to merge; fetch threads block once
+    # max_parsing pages are waiting for a parser, so a slow parse stage holds back fetching
+
+    def __init__(self, fetch_workers=8, parse_workers=None, max_parsing=None, rate_limiter=None):
+        parse_workers = (os.cpu_count() or 1) if parse_workers is None else parse_workers
+        self.fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers)
+        self.parse_executor = ProcessPoolExecutor(max_workers=parse_workers)
+        self.parse_slots = threading.BoundedSemaphore(2 * parse_workers if max_parsing is None else max_parsing)
+        self.rate_limiter = rate_limiter
+        self.fetched = 0
+        self.parsed = 0
+
+    def load(self, url):
+        url = page_identity.page_id(url)
+        store = page_store.parsed_page_store
+        if store is not None:
+            stored_url = store.resolve(url)
+            parsed_page = store.get(stored_url)
+            if parsed_page is not None:
+                page_identity.page_index.record(url, parsed_page.canonical_url or stored_url)
+            if parsed_page is not None or store.offline:
+                return _completed(parsed_page)
+        future = Future()
+        self.fetch_executor.submit(self._fetch, url, future)
+        return future
+
+    def _fetch(self, url, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            cache = text_extraction.page_cache
+            if self.rate_limiter is not None and (cache is None or url not in cache):
+                self.rate_limiter.wait(urlparse(url).netloc)
+            htext = getInp(url)
+            self.fetched += 1
+            if not htext:
+                future.set_result(None)
+                return
+            self.parse_slots.acquire()
+            parse_future = self.parse_executor.submit(parse_page_bytes, htext)
+        except BaseException as error:
+            future.set_exception(error)
+            return
+        parse_future.add_done_callback(lambda done: self._parsed(url, future, done))
+
+    def _parsed(self, url, future, parse_future):
+        self.parse_slots.release()
+        try:
+            page_bytes = parse_future.result()
+            parsed_page = ParsedPage.from_bytes(page_bytes)
+            canonical_url = page_identity.page_index.record(url, parsed_page.canonical_url or url)
+            store = page_store.parsed_page_store
+            if store is not None:
+                store.put_bytes(canonical_url, page_bytes)
+                store.alias(url, canonical_url)
+        except BaseException as error:
+            future.set_exception(error)
+            return
+        self.parsed += 1
+        future.set_result(parsed_page)
+
+    def shutdown(self):
+        self.fetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.parse_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,112 @@
+import argparse
+import gzip
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from page_cache import LocalPageSource
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately; with Nagle on, every keep-alive response waits for a delayed ack
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        server = self.server
+        request_number = server.count("requests")
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_every and request_number % server.fail_every == 0:
+            self._send(503, b"", {"Retry-After": "0"})
+            return
+        page = server.page(unquote(urlsplit(self.path).path))
+        if page is None:
+            self._send(404, b"", {})
+            return
+        body, etag, last_modified = page
+        headers = {"ETag": etag, "Last-Modified": last_modified, "Content-Type": "text/html; charset=utf-8"}
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", headers)
+            return
+        if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, 6)
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, body, headers)
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count("bytes_sent", len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageServer(ThreadingHTTPServer):
+    # a local stand-in for the wiki that serves a directory of saved pages at /wiki/<title> with keep-alive, gzip
+    # and ETag revalidation; latency delays every response and fail_every answers every nth request with a 503
+
+    daemon_threads = True
+
+    def __init__(self, directory, address=("127.0.0.1", 0), latency=0.0, fail_every=0):
+        super().__init__(address, _PageHandler)
+        self.source = LocalPageSource(directory)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.counters = {"connections": 0, "requests": 0, "bytes_sent": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return "http://%s:%d/wiki/" % self.server_address[:2]
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+            return self.counters[name]
+
+    def page(self, path):
+        if "/wiki/" not in path:
+            return None
+        file_path = self.source.path_for(path)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, "rb") as page_file:
+            body = page_file.read()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        return body, etag, formatdate(os.path.getmtime(file_path), usegmt=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a directory of saved pages like the wiki does.")
+    parser.add_argument("directory")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every nth request with a 503")
+    arguments = parser.parse_args()
+    server = PageServer(arguments.directory, ("127.0.0.1", arguments.port), arguments.latency, arguments.fail_every)
+    print("serving %s at %s" % (arguments.directory, server.base_url))
+    server.serve_forever()
@@ -0,0 +1,227 @@
+import hashlib
+import importlib.util
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from urllib.parse import unquote
+
+FORMAT_VERSION = 2
+MAGIC = b"RFPS"
+HEADER = struct.Struct("<4s16sIIIII")
+NO_HREF = 0xFFFFFFFF
+EXTRACTION_MODULES = ["text_extraction", "LinkedListModel", "utils", "WikiModel", "page_store", "page_identity",
+                      "tokenizer", "lemmatizer"]
+# data files whose contents change the lemmas of parsed pages
+EXTRACTION_FILES = ["wordnet_nouns.json.gz"]
+MAX_ALIAS_HOPS = 4
+
+_extraction_version = None
+
+
+def extraction_version():
+    global _extraction_version
+    if _extraction_version is None:
+        digest = hashlib.md5(str(FORMAT_VERSION).encode("ascii"))
+        for module_name in EXTRACTION_MODULES:
+            spec = importlib.util.find_spec(module_name)
+            if spec is not None and spec.origin is not None and os.path.exists(spec.origin):
+                with open(spec.origin, "rb") as source_file:
+                    digest.update(source_file.read())
+        for file_name in EXTRACTION_FILES:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+            digest.update(file_name.encode("utf-8"))
+            if os.path.exists(path):
+                with open(path, "rb") as data_file:
+                    digest.update(data_file.read())
+        _extraction_version = digest.digest()
+    return _extraction_version
+
+
+def page_key(url):
+    if "/wiki/" not in url:
+        return url
+    base, title = url.split("/wiki/", 1)
+    title = " ".join(unquote(title).split("#", 1)[0].replace("_", " ").split())
+    return base + "/wiki/" + title[:1].upper() + title[1:]
+
+
+class StringTable:
+
+    def __init__(self):
+        self.strings = []
+        self.string_to_id = {}
+
+    def intern(self, string):
+        string_id = self.string_to_id.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.string_to_id[string] = string_id
+        return string_id
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _uint_view(buffer, offset, count):
+    if sys.byteorder == "little":
+        return buffer[offset:offset + 4 * count].cast("I")
+    values = array("I")
+    values.frombytes(buffer[offset:offset + 4 * count])
+    values.byteswap()
+    return values
+
+
+class ParsedPage:
+
+    def __init__(self, sentences, links, canonical_url=None):
+        self.sentences = sentences
+        self.links = links
+        self.canonical_url = canonical_url
+
+    def to_bytes(self):
+        table = StringTable()
+        lemma_ids = array("I")
+        sentence_starts = array("I", [0])
+        sentence_text_ids = array("I")
+        for text, lemmas in self.sentences:
+            sentence_text_ids.append(table.intern(text))
+            lemma_ids.extend(table.intern(lemma) for lemma in lemmas)
+            sentence_starts.append(len(lemma_ids))
+        link_ids = array("I")
+        for link_text, lemmatized, link_href in self.links:
+            link_ids.append(table.intern(link_text))
+            link_ids.append(table.intern(lemmatized))
+            link_ids.append(NO_HREF if link_href is None else table.intern(link_href))
+        canonical_id = NO_HREF if self.canonical_url is None else table.intern(self.canonical_url)
+        encoded = [string.encode("utf-8") for string in table.strings]
+        string_offsets = array("I", [0])
+        for encoded_string in encoded:
+            string_offsets.append(string_offsets[-1] + len(encoded_string))
+        header = HEADER.pack(MAGIC, extraction_version(), len(table.strings), len(lemma_ids), len(self.sentences),
+                             len(self.links), canonical_id)
+        return b"".join([header, _little_endian(string_offsets), _little_endian(lemma_ids),
+                         _little_endian(sentence_starts), _little_endian(sentence_text_ids),
+                         _little_endian(link_ids)] + encoded)
+
+    @staticmethod
+    def from_bytes(buffer):
+        buffer = memoryview(buffer)
+        if len(buffer) < HEADER.size:
+            return None
+        magic, version, string_count, lemma_count, sentence_count, link_count, canonical_id = HEADER.unpack(
+            buffer[:HEADER.size])
+        if magic != MAGIC or version != extraction_version():
+            return None
+        offset = HEADER.size
+        string_offsets = _uint_view(buffer, offset, string_count + 1)
+        offset += 4 * (string_count + 1)
+        lemma_ids = _uint_view(buffer, offset, lemma_count)
+        offset += 4 * lemma_count
+        sentence_starts = _uint_view(buffer, offset, sentence_count + 1)
+        offset += 4 * (sentence_count + 1)
+        sentence_text_ids = _uint_view(buffer, offset, sentence_count)
+        offset += 4 * sentence_count
+        link_ids = _uint_view(buffer, offset, 3 * link_count)
+        offset += 12 * link_count
+        blob = buffer[offset:]
+        strings = [str(blob[string_offsets[i]:string_offsets[i + 1]], "utf-8") for i in range(string_count)]
+        sentences = []
+        for i in range(sentence_count):
+            lemmas = [strings[lemma_id] for lemma_id in lemma_ids[sentence_starts[i]:sentence_starts[i + 1]]]
+            sentences.append((strings[sentence_text_ids[i]], lemmas))
+        links = []
+        for i in range(0, 3 * link_count, 3):
+            href_id = link_ids[i + 2]
+            links.append((strings[link_ids[i]], strings[link_ids[i + 1]], None if href_id == NO_HREF else strings[href_id]))
+        return ParsedPage(sentences, links, None if canonical_id == NO_HREF else strings[canonical_id])
+
+
+class ParsedPageStore:
+
+    def __init__(self, directory, offline=False):
+        self.directory = directory
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+
+    def _base_path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(page_key(url).encode("utf-8")).hexdigest())
+
+    def path_for(self, url):
+        return self._base_path(url) + ".page"
+
+    def alias_path_for(self, url):
+        return self._base_path(url) + ".alias"
+
+    def resolve(self, url):
+        for _ in range(MAX_ALIAS_HOPS):
+            if os.path.exists(self.path_for(url)):
+                return url
+            alias_path = self.alias_path_for(url)
+            if not os.path.exists(alias_path):
+                return url
+            with open(alias_path, encoding="utf-8") as alias_file:
+                url = alias_file.read()
+        return url
+
+    def get(self, url):
+        path = self.path_for(self.resolve(url))
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as page_file:
+            if os.fstat(page_file.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(page_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                page = ParsedPage.from_bytes(mapped)
+        if page is None:
+            os.remove(path)
+        return page
+
+    def put(self, url, page):
+        self.put_bytes(url, page.to_bytes())
+
+    def _write(self, path, data):
+        # a temporary file of its own for every writer, so that threads storing the same page cannot replace each
+        # other's file away; the last rename wins and both wrote the same page
+        descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as temporary_file:
+                temporary_file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def put_bytes(self, url, page_bytes):
+        self._write(self.path_for(url), page_bytes)
+
+    def alias(self, url, target_url):
+        if page_key(url) == page_key(target_url):
+            return
+        self._write(self.alias_path_for(url), target_url.encode("utf-8"))
+
+    def is_current(self, url):
+        path = self.path_for(url)
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as page_file:
+            header = page_file.read(HEADER.size)
+        return len(header) == HEADER.size and HEADER.unpack(header)[:2] == (MAGIC, extraction_version())
+
+    def __contains__(self, url):
+        return os.path.exists(self.path_for(self.resolve(url)))
+
+
+parsed_page_store = None
+
+
+def set_parsed_page_store(store):
+    global parsed_page_store
+    parsed_page_store = store
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from WikiModel import parse_page
+from page_cache import LocalPageSource, PageCache
+from page_pipeline import PagePipeline
+from text_extraction import set_page_cache
+
+
+def parse_serially(pages):
+    return [parse_page(htext) for _, htext in pages]
+
+
+def parse_in_pipeline(urls, parse_workers):
+    pipeline = PagePipeline(fetch_workers=8, parse_workers=parse_workers)
+    try:
+        return [future.result() for future in [pipeline.load(url) for url in urls]]
+    finally:
+        pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    source = LocalPageSource(sys.argv[1])
+    worker_counts = [int(count) for count in sys.argv[2:]] or [1, 2, 4]
+    pages = list(source.pages())
+    set_page_cache(PageCache(fetcher=source, max_entries=len(pages)))
+    urls = [url for url, _ in pages]
+    start = time.perf_counter()
+    expected = parse_serially(pages)
+    serial_time = time.perf_counter() - start
+    print("%d pages, serial: %.1f pages/s" % (len(pages), len(pages) / serial_time))
+    for worker_count in worker_counts:
+        start = time.perf_counter()
+        parsed_pages = parse_in_pipeline(urls, worker_count)
+        elapsed = time.perf_counter() - start
+        matches = all(parsed.sentences == page.sentences and parsed.links == page.links for parsed, page in
+                      zip(parsed_pages, expected))
+        print("%d workers: %.1f pages/s (%.2fx)%s" % (worker_count, len(pages) / elapsed, serial_time / elapsed,
+                                                      "" if matches else ", MISMATCH"))
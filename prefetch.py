@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import text_extraction
+from WikiModel import WikiPage, load_parsed_page
+from page_pipeline import PagePipeline
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_second=None):
+        self.interval = None if requests_per_second is None else 1 / requests_per_second
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if self.interval is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PagePrefetcher:
+
+    def __init__(self, target_term, workers=4, requests_per_second=None, parse_workers=0):
+        self.target_term = target_term
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pipeline = None
+        if parse_workers > 0:
+            self.pipeline = PagePipeline(workers, parse_workers, rate_limiter=self.rate_limiter)
+        self.pending = {}
+
+    def _load(self, url):
+        cache = text_extraction.page_cache
+        if cache is None or url not in cache:
+            self.rate_limiter.wait(urlparse(url).netloc)
+        return load_parsed_page(url)
+
+    def prefetch(self, links):
+        # parsed pages only depend on the page, so a load stays useful when the queued link for it is replaced
+        wanted = dict.fromkeys(link for link in links if not link.is_target)
+        for link in list(self.pending):
+            if link not in wanted:
+                self.pending.pop(link).cancel()
+        for link in wanted:
+            if link not in self.pending:
+                self.pending[link] = self._submit(link.page_url)
+
+    def _submit(self, url):
+        if self.pipeline is not None:
+            return self.pipeline.load(url)
+        return self.executor.submit(self._load, url)
+
+    def take(self, link):
+        # the WikiPage is built here, so it belongs to the link that was actually popped
+        pending = self.pending.pop(link, None)
+        if pending is None:
+            pending = self._submit(link.page_url) if self.pipeline is not None else None
+        parsed_page = load_parsed_page(link.page_url) if pending is None else pending.result()
+        return WikiPage.from_parsed_page(parsed_page, link.original_link_text, self.target_term, link, link.page_url)
+
+    def shutdown(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.executor.shutdown(wait=False)
+        if self.pipeline is not None:
+            self.pipeline.shutdown()
@@ -0,0 +1,63 @@
+import heapq
+import random
+import sys
+import time
+
+from distance_model import PriorityQueue
+
+
+def generate_operations(link_count, seed=0):
+    generator = random.Random(seed)
+    operations = []
+    for i in range(link_count):
+        operations.append((generator.randint(0, 10 * link_count), i))
+        if i > 0 and generator.random() < 0.3:
+            operations.append((generator.randint(0, 10 * link_count), generator.randrange(i)))
+    return operations
+
+
+def run_priority_queue(operations):
+    queue = PriorityQueue()
+    for key, value in operations:
+        old_key = queue.get_key(value)
+        if old_key is None or key < old_key:
+            queue.push(key, value)
+    popped = []
+    while len(queue) > 0:
+        popped.append(queue.pop().key)
+    return popped
+
+
+def run_heapq(operations):
+    heap = []
+    best = {}
+    for key, value in operations:
+        old_key = best.get(value)
+        if old_key is None or key < old_key:
+            best[value] = key
+            heapq.heappush(heap, (key, value))
+    popped = []
+    while heap:
+        key, value = heapq.heappop(heap)
+        if best.get(value) != key:
+            continue
+        del best[value]
+        popped.append(key)
+    return popped
+
+
+def time_run(run, operations):
+    start = time.perf_counter()
+    result = run(operations)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10 ** 5, 10 ** 6]
+    for size in sizes:
+        operations = generate_operations(size)
+        queue_time, queue_result = time_run(run_priority_queue, operations)
+        heapq_time, heapq_result = time_run(run_heapq, operations)
+        assert queue_result == heapq_result
+        print("%d links, %d operations: PriorityQueue %.3fs, heapq %.3fs (%.2fx)" %
+              (size, len(operations), queue_time, heapq_time, queue_time / heapq_time))
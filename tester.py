@@ -1,4 +1,15 @@
+import logging
+
 from distance_model import DistanceModel
+from instrumentation import Instrumentation, LoggingSink, set_instrumentation
+from page_cache import PageCache
+from page_store import ParsedPageStore, set_parsed_page_store
+from text_extraction import set_page_cache
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+set_instrumentation(Instrumentation([LoggingSink()]))
+set_page_cache(PageCache("page_cache.sqlite"))
+set_parsed_page_store(ParsedPageStore("page_store"))
 
 model = DistanceModel("Marco Polo", "Donald Trump")
 
@@ -0,0 +1,29 @@
+import batch
+import benchmark
+from page_cache import LocalPageSource, PageCache
+from text_extraction import set_page_cache
+
+
+def test_budget_keeps_unproven_paths(tmp_path):
+    corpus = str(tmp_path / "corpus")
+    benchmark.generate_corpus(corpus, 40, 3)
+    source = LocalPageSource(corpus)
+    set_page_cache(PageCache(fetcher=source, max_entries=10000))
+    titles = [url.rsplit("/wiki/", 1)[1] for url, _ in source.pages()]
+    pairs = [(start_term, target_term) for start_term in titles[:10] for target_term in titles[-10:]
+             if start_term != target_term]
+    shortest = {(record["start"], record["target"]): record for record in batch.BatchRunner(pairs, 2).run()}
+    records = list(batch.BatchRunner(pairs, 2, max_expansions=2).run())
+    assert len(records) == len(pairs)
+    unproven = [record for record in records if record["found"] and not record["optimal"]]
+    assert unproven
+    for record in records:
+        if not record["found"]:
+            continue
+        best = shortest[record["start"], record["target"]]
+        assert best["optimal"]
+        assert record["path"][0] == record["start"]
+        if record["optimal"]:
+            assert record["distance"] == best["distance"]
+        else:
+            assert record["distance"] >= best["distance"]
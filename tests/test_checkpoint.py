@@ -0,0 +1,40 @@
+import benchmark
+import checkpoint
+from distance_model import DistanceModel
+from page_cache import LocalPageSource, PageCache
+from text_extraction import set_page_cache
+
+
+def run_search(model):
+    while not model.iterate():
+        pass
+    return model
+
+
+def test_spilling_search_resumes_twice(tmp_path):
+    corpus = str(tmp_path / "corpus")
+    benchmark.generate_corpus(corpus, 40, 3)
+    source = LocalPageSource(corpus)
+    set_page_cache(PageCache(fetcher=source, max_entries=10000))
+    titles = [url.rsplit("/wiki/", 1)[1] for url, _ in source.pages()]
+    arguments = dict(max_queued=8, overflow="spill", spill_directory=str(tmp_path))
+    for start_term, target_term in zip(titles, reversed(titles)):
+        if start_term == target_term:
+            continue
+        expected = run_search(DistanceModel(start_term, target_term)).result_distance
+        path = str(tmp_path / ("%s.log" % start_term))
+        model = DistanceModel(start_term, target_term, checkpoint=checkpoint.SearchCheckpoint(path, 2), **arguments)
+        for _ in range(5):
+            if model.iterate():
+                break
+        model.checkpoint.close()
+        # the first resume compacts the log; the second replays the compacted log onto a fresh queue
+        for _ in range(2):
+            model = checkpoint.resume(path, 2, **arguments)
+            for _ in range(3):
+                if model.iterate():
+                    break
+            model.checkpoint.close()
+        model = checkpoint.run(checkpoint.resume(path, 2, **arguments))
+        assert model.result_distance == expected
+        set_page_cache(PageCache(fetcher=source, max_entries=10000))
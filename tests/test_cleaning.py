@@ -0,0 +1,26 @@
+import os
+
+from cleaning_benchmark import (clean, generated_lines, legacy_check, legacy_check_spaces, legacy_clean,
+                                legacy_destroy_citations, outcome, page_texts)
+from text_extraction import check, check_spaces, destroy_citations
+
+PAGES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+
+def test_cleaning_matches_legacy_on_generated_lines():
+    for line in generated_lines(20000):
+        assert outcome(destroy_citations, line) == outcome(legacy_destroy_citations, line), line
+        assert outcome(check_spaces, line) == outcome(legacy_check_spaces, line), line
+        assert outcome(check, line) == outcome(legacy_check, line), line
+        assert outcome(clean, line) == outcome(legacy_clean, line), line
+
+
+def test_cleaning_matches_legacy_on_pages():
+    pages = list(page_texts(PAGES_DIRECTORY))
+    assert pages
+    for file_name, text in pages:
+        assert clean(text).strip()
+        assert outcome(clean, text) == outcome(legacy_clean, text), file_name
+        for line in text.split("\n"):
+            assert outcome(destroy_citations, line) == outcome(legacy_destroy_citations, line), line
+            assert outcome(check, line) == outcome(legacy_check, line), line
@@ -0,0 +1,35 @@
+import os
+
+import link_graph
+import page_store
+from distance_model import DistanceModel
+from heuristics import LandmarkHeuristic
+from page_cache import LocalPageSource, PageCache
+from text_extraction import set_page_cache
+
+# Sss links Ppp under the anchor "Pee", which Ppp only mentions right before Ttt, far from its own title
+ANCHORS = os.path.join(os.path.dirname(__file__), "fixtures", "anchors")
+
+
+def run_search(model):
+    while not model.iterate():
+        pass
+    return model
+
+
+def test_landmarks_match_dijkstra_when_anchors_differ_from_titles(tmp_path):
+    source = LocalPageSource(ANCHORS)
+    set_page_cache(PageCache(fetcher=source, max_entries=1000))
+    page_store.set_parsed_page_store(page_store.ParsedPageStore(str(tmp_path)))
+    try:
+        titles = [url.rsplit("/wiki/", 1)[1] for url, _ in source.pages()]
+        expected = {title: run_search(DistanceModel(title, "Ttt")).result_distance for title in titles}
+        graph = link_graph.build_graph(page_store.parsed_page_store, titles, titles)
+        heuristic = LandmarkHeuristic.build(graph, len(graph))
+        for title in titles:
+            if title == "Ttt":
+                continue
+            assert run_search(DistanceModel(title, "Ttt", heuristic=heuristic)).result_distance == expected[title]
+            assert link_graph.GraphSearch(graph).search(title, "Ttt").cost == expected[title]
+    finally:
+        page_store.set_parsed_page_store(None)
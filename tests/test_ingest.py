@@ -0,0 +1,38 @@
+import bz2
+import os
+
+import ingest
+from page_store import ParsedPageStore
+from utils import get_wiki_url
+
+DUMP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sample_dump.xml")
+
+
+def test_dump_pages_skips_other_namespaces():
+    pages = list(ingest.dump_pages(DUMP_PATH))
+    assert [(title, redirect) for title, redirect, _ in pages] == [("Marco Polo", None), ("Venice", None),
+                                                                   ("Venezia", "Venice")]
+
+
+def test_wikitext_keeps_article_links():
+    wikitext = next(ingest.dump_pages(DUMP_PATH))[2]
+    html = ingest.wikitext_to_html(wikitext)
+    assert '<a href="/wiki/Yuan_dynasty">China</a>' in html
+    assert ">films</a>" in html
+    assert "Infobox" not in html and "citation" not in html and "portrait" not in html
+    assert "Category" not in html and "fr:" not in html
+
+
+def test_ingest_is_resumable_and_resolves_redirects(tmp_path):
+    dump_path = tmp_path / "dump.xml.bz2"
+    with open(DUMP_PATH, "rb") as dump_file:
+        dump_path.write_bytes(bz2.compress(dump_file.read()))
+    store = ParsedPageStore(str(tmp_path / "store"))
+    assert ingest.ingest(store, ingest.dump_items(str(dump_path)), workers=2) == (2, 0, 1)
+    assert ingest.ingest(store, ingest.dump_items(str(dump_path)), workers=2) == (0, 2, 1)
+    venice = store.get(get_wiki_url("Venezia"))
+    assert venice is not None
+    assert venice.sentences[0][0].strip() == "Venice is a city in Italy."
+    assert [link_href for _, _, link_href in venice.links] == ["/wiki/Marco_Polo"]
+    marco_polo = store.get(get_wiki_url("Marco_Polo"))
+    assert "/wiki/Star_Wars%3A_A_New_Hope" in [link_href for _, _, link_href in marco_polo.links]
@@ -0,0 +1,15 @@
+import time
+
+from page_cache import PageCache
+
+
+def test_offline_cache_serves_expired_pages(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path / "cache.sqlite"), ttl=60, offline=True)
+    cache.put("https://en.wikipedia.org/wiki/Venice", "<p>Venice</p>")
+    cache._memory.clear()
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get("https://en.wikipedia.org/wiki/Venice") == "<p>Venice</p>"
+    assert cache.get("https://en.wikipedia.org/wiki/Venice") == "<p>Venice</p>"
+    assert cache.stats()["expired"] == 0
+    assert cache.stats()["stale_served"] == 2
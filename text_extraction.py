@@ -1,12 +1,15 @@
 import re
-import urllib
-from urllib.request import Request
+from html.parser import HTMLParser
+
+import instrumentation
+import page_identity
+from http_client import FetchError, HttpClient
 
 web = ["www.", "://", ".com", ".net", ".org", ".us", ".gov"]
 accepted_tags = ["p", "span", "article", "font", "blockquote"]
 exclude = ["cite"]
 accepted_classes = {"paragraph", "text"}
-bad_phrases = ["back to top", "home", "welcome", "you are here:", "itunes", "google", "facebook", "twitter", "comment"]
+bad_phrases = {"back to top", "home", "welcome", "you are here:", "itunes", "google", "facebook", "twitter", "comment"}
 bad_subphrases = ["powered by", "around the web", "around the internet", "et al", "ndl", "view source", "view history",
                   "edit links", "last modified", "text is available under", "creative commons"]
 bad_headers = ["References", "Citations", "Further Reading", "External Links", "Footnotes", "See Also"]
@@ -18,13 +21,25 @@ C = re.compile("[\\[\\{].*[\\]\\}]")
 D = re.compile("[A-Z]{2,3}: {0,2}[0-9]{3,}.{0,2}[0-9]*")
 E = re.compile("\\([a-zA-Z\\s]+ ([0-9]+[.]*)+\\)")
 F = re.compile("(\\\\[a-zA-Z0-9]{1,5})")
+ascii_digit = re.compile("[0-9]")
+bad_subphrase_pattern = re.compile("|".join(re.escape(item) for item in bad_subphrases))
+web_pattern = re.compile("|".join(re.escape(item) for item in web))
+# the trailing bracket has always been part of this pattern; without it newlines would be merged before check()
+spaces_before_bracket = re.compile("\\s{2,}]")
+repeated_spaces = re.compile(" {2,}")
+repeated_line_breaks = re.compile("[\\r\\n]{3,}")
+escaped_characters = re.compile("\\\\([nrt'])")
+unescaped = {"n": "\n", "'": "'", "r": " ", "t": " "}
+
+
 def add_item(goods, parent):
     goods.append(parent)
 
 
 def find_good(parent, goods, wiki_mode):
     if parent is not None:
-        if not parent.__class__.__name__ == "NavigableString" and not parent.__class__.__name__ == "Comment":
+        # script, style and comment strings have no children and are skipped like comments
+        if hasattr(parent, "children"):
             if hasattr(parent, "name"):
                 if parent.name in accepted_tags:
                     add_item(goods, parent)
@@ -64,12 +79,7 @@ def decide(factors, threshold):
 
 
 def check(text):
-    texts = text.split("\n")
-    result = ""
-    for item in texts:
-        new = (checkIndividual(item) + "\n")
-        result += new
-    return result
+    return "".join([checkIndividual(item) + "\n" for item in text.split("\n")])
 
 
 def checkIndividual(text):
@@ -79,12 +89,12 @@ def checkIndividual(text):
     stripped = text.lower().strip("\n").strip("\t").strip(" ").strip("\r")
     if stripped in bad_phrases:
         return ""
-    for item in bad_subphrases:
-        if item in stripped:
-            return ""
-    for item in web:
-        if item in text:
-            text = text.replace(item, "")
+    if bad_subphrase_pattern.search(stripped):
+        return ""
+    if web_pattern.search(text):
+        for item in web:
+            if item in text:
+                text = text.replace(item, "")
     if len(stripped) < 7:
         return ""
     if not text[0].isalnum() and not text[0] == " " and not text[0] == "/t" and not text[0] == "\n":
@@ -119,16 +129,26 @@ def extract(item):
 
 
 def check_spaces(text):
-    obj = re.compile("[\\s \\t\\n]{2,}]")
-    text = obj.sub(" ", text)
-    text = re.compile("[ ]{2,}").sub(" ", text)
+    text = spaces_before_bracket.sub(" ", text)
+    text = repeated_spaces.sub(" ", text)
     text = text.replace("\n ", "\n").replace(" \n", "\n")
-    text = re.compile("[\\r\\n]{3,}").sub("\n", text)
+    text = repeated_line_breaks.sub("\n", text)
     return text
 
 
 def destroy_citations(text):
-    return A.sub(" ", B.sub(" ", C.sub("", D.sub(" ", E.sub(" ", F.sub(" ", text))))))
+    # no substitution introduces a backslash, bracket, colon or digit, so each check stays valid for the later patterns
+    if "\\" in text:
+        text = F.sub(" ", text)
+    if "(" in text:
+        text = E.sub(" ", text)
+    if ":" in text:
+        text = D.sub(" ", text)
+    if "[" in text or "{" in text:
+        text = C.sub("", text)
+    if ascii_digit.search(text):
+        text = A.sub(" ", B.sub(" ", text))
+    return text
 
 
 def get_text(soup):
@@ -151,17 +171,260 @@ def get_text(soup):
     #return text.split(BAD_STUFF)[0]
     return text
 
+
+empty_element_tags = {"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta",
+                      "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex",
+                      "nextid", "spacer"}
+raw_text_tags = {"script", "style"}
+preserve_whitespace_tags = {"pre", "textarea"}
+ascii_spaces = " \n\t\x0c\r"
+longest_bad_header = max(len(header) for header in bad_headers)
+
+OUTSIDE, WALK, GOOD = 0, 1, 2
+
+
+class _OpenElement:
+    __slots__ = ("name", "mode", "mark", "header", "has_href", "excluded")
+
+    def __init__(self, name, mode, mark, checked, has_href, excluded):
+        self.name = name
+        self.mode = mode
+        self.mark = mark
+        self.header = "" if checked else None
+        self.has_href = has_href
+        self.excluded = excluded
+
+
+class StreamingExtractor(HTMLParser):
+    # mirrors find_good, extract and extract_links_generator over a BeautifulSoup html.parser tree in one pass
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.pending = []
+        self.goods = []
+        self.good_chunks = None
+        self.cutoff = None
+        self.html_seen = False
+        self.links = []
+        self.anchor_chunks = None
+        self.anchor_href = None
+        self.href_depth = 0
+        self.canonical_href = None
+        self.closed_empty_elements = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._open(tag, dict(attrs))
+        if tag in empty_element_tags:
+            self._close(tag)
+            self.closed_empty_elements.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self._open(tag, dict(attrs))
+        self._close(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_empty_elements:
+            self.closed_empty_elements.remove(tag)
+        else:
+            self._flush()
+            self._close(tag)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith("CDATA["):
+            self._text(data[len("CDATA["):], cdata=True)
+
+    def close(self):
+        super().close()
+        self._flush()
+        while self.stack:
+            self._finish(self.stack.pop())
+
+    def _flush(self):
+        if self.pending:
+            data = "".join(self.pending)
+            self.pending = []
+            self._text(data)
+
+    def _open(self, tag, attrs):
+        parent = self.stack[-1] if self.stack else None
+        mode = parent.mode if parent is not None else OUTSIDE
+        checked = False
+        excluded = parent is not None and parent.excluded
+        if mode == OUTSIDE and tag == "html" and not self.html_seen:
+            self.html_seen = True
+            mode = WALK
+        elif mode == WALK:
+            checked = tag != "a" and parent.name != "a"
+        if mode == WALK:
+            classes = set(filter(a, (attrs.get("class") or "").split()))
+            if tag in accepted_tags or classes & accepted_classes:
+                mode = GOOD
+                if self.cutoff is None:
+                    self.good_chunks = []
+        elif mode == GOOD and (tag in exclude or tag in raw_text_tags):
+            excluded = True
+        if tag == "link" and self.canonical_href is None and "canonical" in (attrs.get("rel") or "").split():
+            self.canonical_href = attrs.get("href")
+        has_href = tag == "a" and "href" in attrs
+        if has_href:
+            if self.href_depth == 0 and "/wiki/" in (attrs["href"] or ""):
+                self.anchor_chunks = []
+                self.anchor_href = attrs["href"]
+            self.href_depth += 1
+        self.stack.append(_OpenElement(tag, mode, len(self.goods), checked, has_href, excluded))
+
+    def _close(self, tag):
+        if not any(element.name == tag for element in self.stack):
+            return
+        while self.stack:
+            element = self.stack.pop()
+            self._finish(element)
+            if element.name == tag:
+                return
+
+    def _finish(self, element):
+        if element.header is not None and element.header.strip() in bad_headers:
+            self._cut(element.mark)
+        parent_mode = self.stack[-1].mode if self.stack else OUTSIDE
+        if element.mode == GOOD and parent_mode != GOOD:
+            if self.good_chunks is not None:
+                self.goods.append("".join(self.good_chunks).replace("\n", " "))
+            self.good_chunks = None
+        if element.has_href:
+            self.href_depth -= 1
+            if self.href_depth == 0 and self.anchor_chunks is not None:
+                self.links.append(("".join(self.anchor_chunks), self.anchor_href))
+                self.anchor_chunks = None
+
+    def _cut(self, mark):
+        if self.cutoff is None or mark < self.cutoff:
+            self.cutoff = mark
+            del self.goods[mark:]
+        self.good_chunks = None
+
+    def _text(self, data, cdata=False):
+        if not self.stack:
+            return
+        if not data.strip(ascii_spaces) and not any(element.name in preserve_whitespace_tags for element in self.stack):
+            data = "\n" if "\n" in data else " "
+        parent = self.stack[-1]
+        if parent.name in raw_text_tags and not cdata:
+            # script and style text only counts towards the text of the raw text element itself
+            if parent.header is not None:
+                self._add_header(parent, data)
+            return
+        for element in self.stack:
+            if element.header is not None:
+                self._add_header(element, data)
+        if self.anchor_chunks is not None:
+            self.anchor_chunks.append(data)
+        if parent.mode == GOOD:
+            if self.good_chunks is not None and not parent.excluded:
+                self.good_chunks.append(data)
+        elif parent.mode == WALK and not cdata:
+            if parent.name != "a" and data.strip() in bad_headers:
+                self._cut(len(self.goods))
+            elif self.cutoff is None:
+                self.goods.append(data.replace("\n", " "))
+
+    @staticmethod
+    def _add_header(element, data):
+        header = element.header + data if element.header else data.lstrip()
+        if len(header) > 2 * longest_bad_header:
+            stripped = header.rstrip()
+            if len(stripped) > longest_bad_header:
+                element.header = None
+                return
+            # headers never hold two whitespace characters in a row, so longer runs need not be kept
+            header = header[:len(stripped) + 2]
+        element.header = header
+
+    def raw_text(self):
+        return "".join([good + "\n" for good in self.goods])
+
+    def text(self):
+        text = check_spaces(self.raw_text())
+        text = check(text)
+        return check_spaces(text)
+
+
+def extract_document(htext):
+    # like extract_page, plus the href of the page's canonical link, which names the article a redirect led to
+    extractor = StreamingExtractor()
+    with instrumentation.current.timer("html_parse"):
+        extractor.feed(htext)
+        extractor.close()
+    with instrumentation.current.timer("text_clean"):
+        text = extractor.text()
+    return text, extractor.links, extractor.canonical_href
+
+
+def extract_page(htext):
+    text, links, _ = extract_document(htext)
+    return text, links
+
+
+page_cache = None
+
+
+def set_page_cache(cache):
+    global page_cache
+    page_cache = cache
+
+
 def getInp(url):
+    if page_cache is not None:
+        return page_cache.get(url, fetch_page, fetch_validated)
+    return fetch_page(url)
+
+
+def unescape_page(html):
+    # one pass over the escaped newlines, quotes, carriage returns and tabs left in fetched pages
+    return escaped_characters.sub(lambda match: unescaped[match.group(1)], html)
+
+
+def fetch_page(url):
+    return fetch_validated(url)[0]
+
+
+def fetch_validated(url, validators=None):
+    # returns the page and its validators; the page is None when the server confirmed the validators of a cached
+    # copy, and "" when it could not be fetched
     try:
-        req = Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36')
-        response = urllib.request.urlopen(req).read()
-        html = response.decode('utf-8', errors='ignore').strip()
-        html = html.replace("\\n", '\n').replace("\\'", "'").replace("\'", "'").replace("\\r", " ").replace("\\t", " ")
-        print("REACHED", url)
-        return html
-    except Exception:
-        print("COULD NOT REACH", url)
-        return ""
+        with instrumentation.current.timer("fetch", url=url):
+            response = fetch_client.get(url, validators)
+            html = None if response.not_modified else unescape_page(response.text.strip())
+    except FetchError as error:
+        instrumentation.current.count("fetch_failures")
+        instrumentation.current.event("could_not_reach", url=url, status=error.status, reason=error.reason)
+        return "", None
+    if response.url != url:
+        page_identity.page_index.record(url, response.url)
+    instrumentation.current.count("pages_fetched" if html is not None else "pages_revalidated")
+    instrumentation.current.count("bytes_received", response.bytes_received)
+    instrumentation.current.event("reached", url=url, status=response.status)
+    return html, response.validators
+
+
+fetch_client = HttpClient()
 
 
+def set_fetch_client(client):
+    global fetch_client
+    fetch_client = client
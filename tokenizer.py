@@ -0,0 +1,191 @@
+import gzip
+import json
+import os
+import re
+import string
+import sys
+
+# the tokenizer follows TextBlob's pipeline: punkt sentences, the NLTK treebank word tokenizer, then words with
+# their edge punctuation stripped; everything is done with a few precompiled patterns per sentence
+
+ABBREVIATIONS = {"adm", "al", "ala", "apr", "approx", "ariz", "assn", "aug", "ave", "b.c", "bros", "c", "ca", "calif",
+                 "capt", "cf", "co", "col", "colo", "conn", "corp", "cpl", "d.c", "dec", "dept", "dr", "e.g", "esp",
+                 "est", "etc", "feb", "fig", "fla", "fr", "ft", "ga", "gen", "gov", "hon", "i.e", "ill", "inc", "jan",
+                 "jr", "jul", "jun", "kan", "ky", "la", "lt", "ltd", "maj", "mar", "mass", "md", "messrs", "mich",
+                 "minn", "miss", "mo", "mr", "mrs", "ms", "mt", "no", "nov", "oct", "ok", "ore", "pa", "ph.d", "pp",
+                 "prof", "pvt", "rep", "reps", "rev", "sen", "sens", "sep", "sept", "sgt", "sr", "st", "tenn", "tex",
+                 "u.k", "u.n", "u.s", "u.s.a", "v", "va", "vol", "vols", "vs", "wash", "wis"}
+# words that start sentences far more often than they appear capitalized inside one
+SENTENCE_STARTERS = {"A", "After", "All", "Also", "An", "And", "As", "At", "But", "By", "During", "For", "From", "He",
+                     "Her", "His", "However", "I", "If", "In", "It", "Its", "Many", "Most", "On", "One", "She", "Some",
+                     "That", "The", "Their", "There", "These", "They", "This", "To", "Under", "We", "When", "While",
+                     "With"}
+
+sentence_end = re.compile("[.?!]+[\"')\\]}’”]*(?=\\s)")
+leading_openers = re.compile("^[\"'(\\[{‘“`]+")
+number_token = re.compile("^-?[.,]?\\d[\\d,.\\-]*\\.$")
+# everything the treebank tokenizer splits off as a token of its own; commas and colons only split when no digit
+# follows, so 3,36 and 10:30 stay whole, and unicode quotes and dashes are kept since only ascii punctuation is
+# stripped from words
+word_separators = re.compile("([«»‘’“”„‒-―])|[\\s;@#$%&?!*()\\[\\]{}<>\"`]+|''|--+|\\.{2,}|[,:](?!\\d)")
+opening_quote = re.compile("^'(?!(?:re|ve|ll|m|t|s|d|n)\\b)(?=\\w)", re.IGNORECASE)
+contraction_suffix = re.compile("(?<=[^' ])('[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T|')$")
+final_period = re.compile("(?<=[^.])\\.[\\])}>\"']*$")
+split_contractions = {"cannot": 3, "d'ye": 1, "gimme": 3, "gonna": 3, "gotta": 3, "lemme": 3, "more'n": 4,
+                      "wanna": 3, "'tis": 2, "'twas": 2}
+punctuation = string.punctuation
+
+
+def _is_sentence_end(text, match):
+    marks = match.group()
+    if "?" in marks or "!" in marks:
+        return True
+    token_start = text.rfind(" ", 0, match.start()) + 1
+    token_start = max(token_start, text.rfind("\n", 0, match.start()) + 1)
+    token = leading_openers.sub("", text[token_start:match.end()].rstrip("\"')]}’”"))
+    next_start = match.end()
+    while next_start < len(text) and text[next_start].isspace():
+        next_start += 1
+    next_word = leading_openers.sub("", text[next_start:next_start + 32].split(None, 1)[0] if next_start < len(
+        text) else "")
+    if not next_word:
+        return True
+    starter = next_word.rstrip(punctuation) in SENTENCE_STARTERS
+    if token.endswith(".."):
+        return starter
+    word = token[:-1]
+    if (len(word) == 1 and word.isalpha()) or word.lower() in ABBREVIATIONS:
+        return starter
+    if number_token.match(token):
+        return not next_word[0].islower()
+    return True
+
+
+def split_sentences(text):
+    # a break follows ., ? or ! and any closing quotes or brackets when whitespace comes next; abbreviations,
+    # initials and ellipses only end a sentence before a common sentence starter, numbers only before a capital
+    sentences = []
+    start = 0
+    for match in sentence_end.finditer(text):
+        if match.end() <= start or not _is_sentence_end(text, match):
+            continue
+        sentences.append(text[start:match.end()])
+        start = match.end()
+        while start < len(text) and text[start].isspace():
+            start += 1
+    if start < len(text) and not text[start:].isspace():
+        sentences.append(text[start:])
+    return sentences
+
+
+def _chunk_words(chunk, last, words):
+    quote = opening_quote.match(chunk)
+    if quote is not None:
+        chunk = chunk[1:]
+    if last:
+        period = final_period.search(chunk)
+        if period is not None:
+            chunk = chunk[:period.start()]
+    split_at = split_contractions.get(chunk.lower())
+    if split_at is not None:
+        pieces = [chunk[:split_at], chunk[split_at:]]
+    else:
+        suffix = contraction_suffix.search(chunk)
+        pieces = [chunk] if suffix is None else [chunk[:suffix.start()], suffix.group()]
+    for piece in pieces:
+        if piece.startswith("'"):
+            if piece.strip(punctuation):
+                words.append(piece)
+        else:
+            piece = piece.strip(punctuation)
+            if piece:
+                words.append(piece)
+
+
+def tokenize_words(sentence):
+    # the words TextBlob yields for one sentence: treebank tokens with their edge punctuation stripped, keeping
+    # contraction suffixes such as 's and n't whole
+    chunks = [chunk for chunk in word_separators.split(sentence) if chunk]
+    words = []
+    for index, chunk in enumerate(chunks):
+        _chunk_words(chunk, index == len(chunks) - 1, words)
+    return words
+
+
+class NativeTokenizer:
+    name = "native"
+
+    def sentence_words(self, text):
+        return [(sentence, tokenize_words(sentence)) for sentence in split_sentences(text)]
+
+    def words(self, text):
+        return [word for sentence in split_sentences(text) for word in tokenize_words(sentence)]
+
+
+class BlobTokenizer:
+    # TextBlob and NLTK punkt, for comparison and for texts the native rules get wrong
+    name = "textblob"
+
+    def sentence_words(self, text):
+        from textblob import TextBlob
+        return [(sentence.string, [str(word) for word in sentence.words]) for sentence in TextBlob(text).sentences]
+
+    def words(self, text):
+        from textblob import TextBlob
+        return [str(word) for word in TextBlob(text).words]
+
+
+NOUN_SUBSTITUTIONS = [("s", ""), ("ses", "s"), ("ves", "f"), ("xes", "x"), ("zes", "z"), ("ches", "ch"),
+                      ("shes", "sh"), ("men", "man"), ("ies", "y")]
+LEMMA_TABLE_VERSION = 1
+LEMMA_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wordnet_nouns.json.gz")
+
+
+class MorphyTable:
+    # WordNet's noun morphy, as Word.lemmatize() calls it, over the noun lemmas and exceptions of a WordNet dump
+
+    def __init__(self, nouns, exceptions):
+        self.nouns = nouns
+        self.exceptions = exceptions
+
+    def lemmatize(self, form):
+        forms = self.exceptions.get(form)
+        if forms is None:
+            forms = [form[:-len(old)] + new for old, new in NOUN_SUBSTITUTIONS if form.endswith(old)]
+        lemmas = [candidate for candidate in dict.fromkeys([form] + forms) if candidate in self.nouns]
+        return min(lemmas, key=len) if lemmas else form
+
+    @staticmethod
+    def build(path=LEMMA_TABLE_PATH):
+        from nltk.corpus import wordnet
+        table = {"version": LEMMA_TABLE_VERSION, "wordnet": wordnet.get_version(),
+                 "nouns": sorted(wordnet.all_lemma_names(pos="n")),
+                 "exceptions": {form: list(lemmas) for form, lemmas in sorted(wordnet._exception_map["n"].items())}}
+        with gzip.open(path, "wt", encoding="utf-8") as table_file:
+            json.dump(table, table_file, separators=(",", ":"))
+        return MorphyTable(set(table["nouns"]), table["exceptions"])
+
+    @staticmethod
+    def load(path=LEMMA_TABLE_PATH):
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as table_file:
+            table = json.load(table_file)
+        if table.get("version") != LEMMA_TABLE_VERSION:
+            return None
+        return MorphyTable(set(table["nouns"]), table["exceptions"])
+
+
+default_tokenizer = NativeTokenizer()
+
+
+def set_default_tokenizer(tokenizer):
+    global default_tokenizer
+    default_tokenizer = tokenizer
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["build-lemmas"]:
+        raise SystemExit("usage: python tokenizer.py build-lemmas [path]")
+    built = MorphyTable.build(*sys.argv[2:3])
+    print("%d nouns, %d exceptions" % (len(built.nouns), len(built.exceptions)))
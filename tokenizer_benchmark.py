@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import time
+from difflib import SequenceMatcher
+
+from text_extraction import extract_page
+from tokenizer import BlobTokenizer, MorphyTable, NativeTokenizer
+
+
+def load_texts(directory):
+    texts = []
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith(".html"):
+            with open(os.path.join(directory, file_name), encoding="utf-8", errors="ignore") as page_file:
+                texts.append(extract_page(page_file.read())[0])
+    return texts
+
+
+def matching(expected, actual):
+    # items of the longest common subsequences, so one disagreement only costs the items around it
+    return sum(block.size for block in SequenceMatcher(None, expected, actual, autojunk=False).get_matching_blocks())
+
+
+def tokenize_all(tokenizer, texts):
+    start = time.perf_counter()
+    results = [tokenizer.sentence_words(text) for text in texts]
+    return time.perf_counter() - start, results
+
+
+def startup_seconds(statement):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    corpus = load_texts(sys.argv[1])
+    blob_time, blob_results = tokenize_all(BlobTokenizer(), corpus)
+    native_time, native_results = tokenize_all(NativeTokenizer(), corpus)
+    sentence_matches = sentence_total = word_matches = word_total = 0
+    for expected, actual in zip(blob_results, native_results):
+        sentence_matches += matching([sentence for sentence, _ in expected], [sentence for sentence, _ in actual])
+        sentence_total += max(len(expected), len(actual))
+        expected_words = [word for _, words in expected for word in words]
+        actual_words = [word for _, words in actual for word in words]
+        word_matches += matching(expected_words, actual_words)
+        word_total += max(len(expected_words), len(actual_words))
+    print("%d pages, %d words" % (len(corpus), word_total))
+    print("sentence agreement: %.2f%%, token agreement: %.2f%%" % (100 * sentence_matches / max(sentence_total, 1),
+                                                                    100 * word_matches / max(word_total, 1)))
+    print("TextBlob: %.0f words/s" % (word_total / blob_time))
+    print("native:   %.0f words/s (%.1fx)" % (word_total / native_time, blob_time / native_time))
+    print("import: TextBlob %.2fs, native %.2fs" % (
+        startup_seconds("from textblob import TextBlob"),
+        startup_seconds("import tokenizer")))
+    table = MorphyTable.load()
+    if table is None:
+        print("no lemma table; build one with: python tokenizer.py build-lemmas")
+    else:
+        from textblob import Word
+        words = sorted({word for results in blob_results for _, sentence in results for word in sentence})
+        agreeing = sum(table.lemmatize(word) == Word(word).lemmatize() for word in words)
+        print("lemma agreement: %.2f%% of %d distinct words" % (100 * agreeing / max(len(words), 1), len(words)))
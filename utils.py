@@ -1,9 +1,16 @@
-from textblob import TextBlob
+from functools import lru_cache
 
+import tokenizer
+from lemmatizer import default_lemmatizer
 
+
+@lru_cache(maxsize=65536)
 def lemmatize_term(term):
-    term_blob = TextBlob(term)
-    return " ".join(word.lemmatize().lower() for word in term_blob.words)
+    return " ".join(default_lemmatizer.lemmatize(word) for word in tokenizer.default_tokenizer.words(term))
 
 def get_wiki_url(term):
-    return "https://en.wikipedia.org/wiki/" + term
\ No newline at end of file
+    return "https://en.wikipedia.org/wiki/" + term
+
+
+def get_backlinks_url(term, limit=500):
+    return "https://en.wikipedia.org/w/index.php?title=Special:WhatLinksHere/%s&limit=%d&hideredirs=1" % (term, limit)
\ No newline at end of file